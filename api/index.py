@@ -6,6 +6,8 @@ This file contains the Flask app for Vercel's serverless environment
 
 import os
 import re
+import sys
+import bisect
 import json
 import hashlib
 import time
@@ -13,47 +15,599 @@ import logging
 import base64
 import zipfile
 import threading
+import multiprocessing
+from contextlib import contextmanager
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import marshal
+import stat
+import tempfile
+import gzip
 from io import BytesIO
+from array import array
+from collections import OrderedDict
 from tempfile import SpooledTemporaryFile
 from pathlib import Path
 from typing import List, Dict, Any, Optional
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, g, has_request_context, render_template, jsonify, request, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.security import safe_join
+
+try:
+    import brotli  # Optional: enables Content-Encoding: br when installed
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image as PILImage  # Optional: enables upload image optimization
+except ImportError:
+    PILImage = None
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Directory -> whether it passed the ownership check, so each is checked once
+_private_dirs: Dict[str, bool] = {}
+
+
+def _private_dir(path):
+    """Create ``path`` if needed; True once it is safe to read and write there.
+
+    Cache and store directories default to shared locations such as /tmp,
+    where another local user could create the directory first and plant
+    entries in it. A directory is only used when it is owned by this
+    process's user and nobody else can write to it.
+    """
+    if path in _private_dirs:
+        return _private_dirs[path]
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError as e:
+        logger.warning(f"Could not create {path}: {e}")
+        return False
+    # Ownership and permission bits only mean something on POSIX
+    if hasattr(os, 'getuid') and (
+        not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o022
+    ):
+        logger.warning(f"Not using {path}: it must be a directory owned by this user and writable by no one else")
+        _private_dirs[path] = False
+        return False
+    _private_dirs[path] = True
+    return True
+
+
+class ParserTrace:
+    """Opt-in tracing for the question parser that costs one check when off.
+
+    Call sites guard on ``enabled`` and pass a %-style message plus its
+    arguments, so nothing is formatted unless a record is actually kept or
+    emitted. Tracing is on while the parser logger is at DEBUG, or while a
+    ``capture()`` is collecting the trace of a single quiz.
+    """
+
+    def __init__(self, trace_logger):
+        self._logger = trace_logger
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._captures = 0
+        self.enabled = False
+        self.refresh()
+
+    def refresh(self):
+        """Recompute ``enabled``; call after changing the log level at runtime."""
+        self.enabled = self._captures > 0 or self._logger.isEnabledFor(logging.DEBUG)
+
+    def log(self, msg, *args):
+        records = getattr(self._local, 'records', None)
+        if records is not None:
+            records.append((msg, args))
+        self._logger.debug(msg, *args)
+
+    @contextmanager
+    def capture(self):
+        """Collect the records this thread emits; yields the (unformatted) record list."""
+        records = []
+        previous = getattr(self._local, 'records', None)
+        self._local.records = records
+        with self._lock:
+            self._captures += 1
+            self.refresh()
+        try:
+            yield records
+        finally:
+            self._local.records = previous
+            with self._lock:
+                self._captures -= 1
+                self.refresh()
+
+    @staticmethod
+    def format_records(records):
+        return [msg % args if args else msg for msg, args in records]
+
+
+parser_trace = ParserTrace(logger)
+
+
+class Metrics:
+    """In-process request and hot-path instrumentation, exported at /metrics.
+
+    Keeps per-route latency histograms, per-stage timing histograms (file
+    read/hash, cache lookup, parse, jsonify, upload image processing), cache
+    hit/miss counters and parse throughput, and renders them in the
+    Prometheus text format. Stage timings taken while serving a request are
+    also collected for that request's ``Server-Timing`` header.
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=BUCKETS, enabled=True):
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._requests: Dict[tuple, List[float]] = {}
+        self._stages: Dict[tuple, List[float]] = {}
+        self._cache_events: Dict[tuple, int] = {}
+        self._questions_parsed = 0
+        self._parse_seconds = 0.0
+
+    def _observe(self, histograms, key, seconds):
+        if not self.enabled:
+            return
+        # Per-bucket counts (made cumulative on render), then sum and count
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = [0] * (len(self.buckets) + 3)
+            histogram[index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def observe_request(self, route, method, status, seconds):
+        self._observe(self._requests, (route, method, str(status)), seconds)
+
+    def observe_stage(self, stage, seconds):
+        self._observe(self._stages, (stage,), seconds)
+        if self.enabled and has_request_context():
+            timings = g.setdefault('_server_timing', {})
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one observation of stage ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - started)
+
+    def cache_event(self, cache, hit):
+        if not self.enabled:
+            return
+        key = (cache, 'hit' if hit else 'miss')
+        with self._lock:
+            self._cache_events[key] = self._cache_events.get(key, 0) + 1
+
+    def record_parse(self, questions, seconds):
+        """Count a parse of ``questions`` questions that took ``seconds``."""
+        self.observe_stage('parse', seconds)
+        if not self.enabled:
+            return
+        with self._lock:
+            self._questions_parsed += questions
+            self._parse_seconds += seconds
+
+    @staticmethod
+    def _labels(names, values):
+        escaped = (
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            for value in values
+        )
+        return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+    def _render_histograms(self, lines, metric, help_text, label_names, histograms):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for key, histogram in sorted(histograms.items()):
+            labels = self._labels(label_names, key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram[-2]:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram[-1]}")
+
+    def render(self, gauges=None):
+        """Prometheus text exposition of every metric, plus ``gauges`` ({name: (help, value)})."""
+        with self._lock:
+            requests = {key: list(value) for key, value in self._requests.items()}
+            stages = {key: list(value) for key, value in self._stages.items()}
+            cache_events = dict(self._cache_events)
+            questions_parsed = self._questions_parsed
+            parse_seconds = self._parse_seconds
+
+        lines = []
+        self._render_histograms(
+            lines, 'mla_http_request_duration_seconds', 'Request latency by route.',
+            ('route', 'method', 'status'), requests,
+        )
+        self._render_histograms(
+            lines, 'mla_stage_duration_seconds', 'Time spent in each hot-path stage.',
+            ('stage',), stages,
+        )
+        lines.append("# HELP mla_cache_requests_total Cache lookups by cache and result.")
+        lines.append("# TYPE mla_cache_requests_total counter")
+        for key, count in sorted(cache_events.items()):
+            lines.append(f"mla_cache_requests_total{{{self._labels(('cache', 'result'), key)}}} {count}")
+        lines.append("# HELP mla_questions_parsed_total Questions produced by the parser.")
+        lines.append("# TYPE mla_questions_parsed_total counter")
+        lines.append(f"mla_questions_parsed_total {questions_parsed}")
+        lines.append("# HELP mla_parse_seconds_total Time spent parsing quiz content.")
+        lines.append("# TYPE mla_parse_seconds_total counter")
+        lines.append(f"mla_parse_seconds_total {parse_seconds:.6f}")
+        lines.append("# HELP mla_parse_questions_per_second Parser throughput while parsing.")
+        lines.append("# TYPE mla_parse_questions_per_second gauge")
+        lines.append(f"mla_parse_questions_per_second {questions_parsed / parse_seconds if parse_seconds else 0.0:.1f}")
+        for name, (help_text, value) in (gauges or {}).items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+# Request instrumentation: MLA_METRICS=0 turns off /metrics and the request
+# hooks; MLA_SERVER_TIMING=0 keeps the metrics but drops the response header.
+_METRICS_ENABLED = os.environ.get('MLA_METRICS', '1') != '0'
+_SERVER_TIMING_ENABLED = os.environ.get('MLA_SERVER_TIMING', '1') != '0'
+metrics = Metrics(enabled=_METRICS_ENABLED)
+
 app = Flask(__name__, 
            template_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates'),
            static_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static'))
 CORS(app)  # Enable CORS for development
 
+class QuestionStore:
+    """Compact, read-only column store for the questions of a cached quiz.
+
+    Parsed questions are dicts with ten keys plus a list each for options
+    and explanations. Held for every cached quiz, those per-question objects
+    dominate worker memory, so the loader caches this store instead: one
+    list or array per field, specialties interned as small integer codes,
+    and each question's options kept as one string of label-free texts with
+    the labels shared between questions. Dicts are only built when a
+    response is serialized, and every access returns fresh dicts, so callers
+    cannot alter the cached quiz.
+
+    A question that does not fit the columns (unexpected keys or types,
+    unlabelled options) is kept as-is and copied on access.
+    """
+
+    FIELDS = (
+        'id', 'title', 'specialty', 'scenario', 'investigations',
+        'image', 'prompt', 'options', 'correct_answer', 'explanations',
+    )
+    _SEPARATOR = '\x1f'
+    _TEXT_FIELDS = ('title', 'scenario', 'investigations', 'image', 'prompt')
+
+    __slots__ = (
+        '_ids', '_specialty_codes', '_specialty_names', '_texts',
+        '_option_labels', '_option_texts', '_answers', '_explanations', '_irregular',
+    )
+
+    def __init__(self, questions=()):
+        self._ids = array('q')
+        self._specialty_codes = array('I')
+        self._specialty_names: List[str] = []
+        self._texts: Dict[str, List[str]] = {field: [] for field in self._TEXT_FIELDS}
+        self._option_labels: List[str] = []
+        self._option_texts: List[Optional[str]] = []
+        self._answers = array('b')
+        self._explanations: List[Optional[str]] = []
+        self._irregular: Dict[int, Dict[str, Any]] = {}
+        self._load(questions)
+
+    def _load(self, questions):
+        codes: Dict[str, int] = {}
+        encode = self._encode
+        text_columns = [self._texts[field] for field in self._TEXT_FIELDS]
+        for q in questions:
+            columns = encode(q)
+            if columns is None:
+                self._irregular[len(self._ids)] = self._copy(q)
+                columns = (0, '', ('',) * len(text_columns), '', None, -1, None)
+            question_id, specialty, texts, labels, option_texts, answer, explanations = columns
+            code = codes.get(specialty)
+            if code is None:
+                code = codes[specialty] = len(self._specialty_names)
+                self._specialty_names.append(sys.intern(specialty))
+            self._ids.append(question_id)
+            self._specialty_codes.append(code)
+            for column, text in zip(text_columns, texts):
+                column.append(text)
+            self._option_labels.append(labels)
+            self._option_texts.append(option_texts)
+            self._answers.append(answer)
+            self._explanations.append(explanations)
+
+    @classmethod
+    def _encode(cls, q):
+        """Column values for ``q``, or None when it has to be stored as-is."""
+        if tuple(q) != cls.FIELDS or type(q['id']) is not int or not -2 ** 63 <= q['id'] < 2 ** 63:
+            return None
+        texts = (q['title'], q['scenario'], q['investigations'], q['image'], q['prompt'])
+        if type(q['specialty']) is not str or set(map(type, texts)) != {str}:
+            return None
+        answer = q['correct_answer']
+        if answer is None:
+            answer = -1
+        elif type(answer) is not int or not 0 <= answer <= 127:
+            return None
+
+        separator = cls._SEPARATOR
+        options = q['options']
+        explanations = q['explanations']
+        if type(options) is not list or type(explanations) is not list:
+            return None
+        labels = ''
+        option_texts = None
+        if options:
+            # Options are "<label>) <text>"; anything else is kept verbatim
+            if set(map(type, options)) != {str} or {option[1:3] for option in options} != {') '}:
+                return None
+            labels = ''.join([option[0] for option in options])
+            option_texts = separator.join([option[3:] for option in options])
+            if option_texts.count(separator) != len(options) - 1:
+                return None
+        joined_explanations = None
+        if explanations:
+            if set(map(type, explanations)) != {str}:
+                return None
+            joined_explanations = separator.join(explanations)
+            if joined_explanations.count(separator) != len(explanations) - 1:
+                return None
+        return q['id'], q['specialty'], texts, sys.intern(labels), option_texts, answer, joined_explanations
+
+    @staticmethod
+    def _copy(q):
+        return {key: list(value) if isinstance(value, list) else value for key, value in q.items()}
+
+    def _value(self, i, field):
+        if field == 'id':
+            return self._ids[i]
+        if field == 'specialty':
+            return self._specialty_names[self._specialty_codes[i]]
+        if field == 'options':
+            labels = self._option_labels[i]
+            if not labels:
+                return []
+            return [f"{label}) {text}" for label, text in zip(labels, self._option_texts[i].split(self._SEPARATOR))]
+        if field == 'correct_answer':
+            answer = self._answers[i]
+            return None if answer < 0 else answer
+        if field == 'explanations':
+            explanations = self._explanations[i]
+            return explanations.split(self._SEPARATOR) if explanations is not None else []
+        return self._texts[field][i]
+
+    def row(self, i, fields=None):
+        """Question ``i`` as a new dict, optionally projected onto ``fields``."""
+        irregular = self._irregular.get(i) if self._irregular else None
+        if irregular is not None:
+            q = self._copy(irregular)
+            return q if fields is None else {field: q[field] for field in fields if field in q}
+        if fields is not None:
+            return {field: self._value(i, field) for field in fields}
+
+        # Full rows are what serialization mostly asks for, so build them inline
+        texts = self._texts
+        separator = self._SEPARATOR
+        labels = self._option_labels[i]
+        answer = self._answers[i]
+        explanations = self._explanations[i]
+        return {
+            'id': self._ids[i],
+            'title': texts['title'][i],
+            'specialty': self._specialty_names[self._specialty_codes[i]],
+            'scenario': texts['scenario'][i],
+            'investigations': texts['investigations'][i],
+            'image': texts['image'][i],
+            'prompt': texts['prompt'][i],
+            'options': [
+                f"{label}) {text}" for label, text in zip(labels, self._option_texts[i].split(separator))
+            ] if labels else [],
+            'correct_answer': None if answer < 0 else answer,
+            'explanations': explanations.split(separator) if explanations is not None else [],
+        }
+
+    def rows(self, positions, fields=None):
+        """Questions at ``positions`` as new dicts, optionally projected onto ``fields``."""
+        return [self.row(i, fields) for i in positions]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def estimated_bytes(self):
+        """Approximate memory retained by the store's columns and strings."""
+        size = sum(map(sys.getsizeof, (self._ids, self._specialty_codes, self._answers, self._option_labels)))
+        size += sum(map(sys.getsizeof, self._specialty_names))
+        for column in (*self._texts.values(), self._option_texts, self._explanations):
+            # Empty strings and None are shared singletons
+            size += sys.getsizeof(column) + sum(sys.getsizeof(text) for text in column if text)
+        for q in self._irregular.values():
+            size += sys.getsizeof(q) + sum(
+                sys.getsizeof(value) + (sum(map(sys.getsizeof, value)) if isinstance(value, list) else 0)
+                for value in q.values()
+            )
+        return size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.rows(range(*key.indices(len(self))))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('question index out of range')
+        return self.row(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def to_columns(self):
+        """Plain builtin form of the store (arrays as bytes), for the disk cache."""
+        return {
+            'ids': self._ids.tobytes(),
+            'specialty_codes': self._specialty_codes.tobytes(),
+            'specialty_names': self._specialty_names,
+            'texts': self._texts,
+            'option_labels': self._option_labels,
+            'option_texts': self._option_texts,
+            'answers': self._answers.tobytes(),
+            'explanations': self._explanations,
+            'irregular': self._irregular,
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        store = cls()
+        store._ids = array('q', columns['ids'])
+        store._specialty_codes = array('I', columns['specialty_codes'])
+        store._specialty_names = [sys.intern(name) for name in columns['specialty_names']]
+        store._texts = columns['texts']
+        store._option_labels = [sys.intern(labels) for labels in columns['option_labels']]
+        store._option_texts = columns['option_texts']
+        store._answers = array('b', columns['answers'])
+        store._explanations = columns['explanations']
+        store._irregular = columns['irregular']
+        return store
+
+
 # Reuse the QuizLoader logic from your existing main.py
 class PWAQuizLoader:
     """PWA version of QuizLoader that reuses your existing parsing logic."""
 
-    _cache: Dict[str, Dict[str, Any]] = {}
+    # In-process parse cache: an LRU (least recently used first) budgeted by
+    # the estimated bytes each entry retains rather than by entry count
+    _cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
     _cache_lock = threading.RLock()
-    _CACHE_MAX_SIZE = 16
-    _quiz_list_cache: Dict[str, Any] = {"timestamp": 0.0, "data": []}
-    _quiz_list_lock = threading.RLock()
-    _QUIZ_LIST_TTL = 30.0
+    _cache_bytes = 0
+    _CACHE_MAX_BYTES = int(os.environ.get('MLA_QUIZ_MEMORY_MAX_BYTES', 128 * 1024 * 1024))
+    # stat_hits: requests validated by (mtime_ns, size, inode) alone, without
+    # reading the file; content_reads: requests that read and hashed the file;
+    # hits / misses: lookups answered from memory versus not; evictions:
+    # entries dropped to stay within _CACHE_MAX_BYTES; blocks_reused /
+    # blocks_reparsed: question blocks carried over from the previous parse
+    # of an edited file versus sent through _parse_question.
+    _cache_stats: Dict[str, int] = {
+        "stat_hits": 0,
+        "content_reads": 0,
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        "blocks_reused": 0,
+        "blocks_reparsed": 0,
+    }
+    _STAT_RACY_WINDOW_NS = 2_000_000_000
+    # Second cache tier: parsed questions written to disk as marshalled builtins
+    # (data only, never pickles), keyed by file MD5, so serverless cold starts
+    # and other workers skip re-parsing. Bump _DISK_CACHE_VERSION whenever the
+    # parser output changes.
+    _DISK_CACHE_VERSION = 5
+    _DISK_CACHE_DIR = os.environ.get(
+        'MLA_QUIZ_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'mla-quiz-cache')
+    )
+    _DISK_CACHE_ENABLED = os.environ.get('MLA_QUIZ_DISK_CACHE', '1') != '0'
+    _DISK_CACHE_MAX_BYTES = int(os.environ.get('MLA_QUIZ_CACHE_MAX_BYTES', 64 * 1024 * 1024))
     QUESTION_RE = re.compile(r'(###\s*\d+\..*?)(?=###\s*\d+\.|\Z)', re.DOTALL)
     SPECIALTY_HEADER_RE = re.compile(r'^##\s+(.+?)$', re.MULTILINE)
+    # Alternative question header formats, tried in order when a document has
+    # no parseable ### questions: (name, detector, header pattern, replacement)
+    _QUESTION_FORMATS = (
+        ('numbered', re.compile(r'^\d+\.\s+', re.MULTILINE),
+         re.compile(r'^(\d+\.\s+)', re.MULTILINE), r'### \1'),
+        ('Q-format', re.compile(r'^Q\d+[.:]', re.MULTILINE),
+         re.compile(r'^Q(\d+)[.:]\s*', re.MULTILINE), r'### \1. '),
+        ('Question-format', re.compile(r'^Question\s+\d+', re.MULTILINE),
+         re.compile(r'^Question\s+(\d+)', re.MULTILINE), r'### \1.'),
+    )
+    _FORMAT_SAMPLE_CHARS = 64 * 1024
+
+    # Question parser engine: "compiled" (single-pass, precompiled patterns) or
+    # "legacy" (the original per-block regex cascade, kept for diffing output).
+    PARSER_ENGINE = os.environ.get('MLA_PARSER_ENGINE', 'compiled').lower()
+
+    # Precompiled patterns used by the compiled parser engine
+    _HEADER_RE = re.compile(r'###\s*(\d+)\.\s*(.*?)\n(.*)', re.DOTALL)
+    _PARAGRAPH_SPLIT_RE = re.compile(r'\n\s*\n')
+    _FIRST_SECTION_OPTION_RE = re.compile(r'^\s*[A-Z][\.)]\s+', re.MULTILINE)
+    _INVESTIGATION_RE = re.compile(r'\*\*Investigations?(?::\*\*|\*\*:|:\*\*|\*\*)\s*', re.IGNORECASE)
+    _IMAGE_ONLY_RE = re.compile(r'^\s*(\[IMAGE:\s*[^\]]+\]|!\[Image\]\([^)]+\))\s*$')
+    _ANSWER_RE = re.compile(r'\*\*Ans(?:wer)?(?::\*\*|\*\*:|:\*\*|\*\*)\s*([A-Z])\.?', re.IGNORECASE)
+    _OPTION_LINE_RE = re.compile(r'^\(?([A-Z])\)?[\.)]\s*(.*)')
+    _PROMPT_OPTION_RE = re.compile(r'^([A-Z])[.)]\s*')
+    _FALLBACK_OPTION_RE = re.compile(r'^\s*[A-Z][.)]\s', re.MULTILINE)
+    _NESTED_LABEL_RE = re.compile(r'^[\(\[]?([A-Z])[\)\.]\s*(.*)')
+    _NESTED_LABEL_SPACED_RE = re.compile(r'^([A-Z])\s*[\)\.]\s*(.*)')
+    _SENTENCE_SPLIT_RE = re.compile(r'[.!]\s+')
+    # One scan over the tail finds which explanation keywords are present, so
+    # patterns that cannot match are skipped instead of searched in turn.
+    _EXPLANATION_KEYWORD_RE = re.compile(
+        r'(?P<explanation>Explanation)|(?P<rationale>Rationale)|(?P<answer>Answer:)', re.IGNORECASE
+    )
+    _EXPLANATION_PATTERNS = (
+        (('explanation', 'rationale'), re.compile(
+            r'\*\*(?:Explanation|Rationale)\*\*:\s*(.*?)(?=\n-{3,}|\n\*\*\s*End Explanation\s*\*\*|$)',
+            re.DOTALL | re.IGNORECASE)),
+        (('explanation',), re.compile(r'Explanation:\s*(.*?)(?=\n\n|\n[A-Z]\.|$)', re.DOTALL | re.IGNORECASE)),
+        (('answer',), re.compile(r'Answer:\s*[A-Z]\.?\s*(.*?)(?=\n\n|\n[A-Z]\.|$)', re.DOTALL | re.IGNORECASE)),
+        (('explanation',), re.compile(r'\*\*Explanation\*\*\s*(.*?)(?=\n\n|\n[A-Z]\.|$)', re.DOTALL | re.IGNORECASE)),
+        (('answer',), re.compile(r'Answer:\s*[A-Z]\.?\s*\n(.*?)(?=\n\n|\n[A-Z]\.|$)', re.DOTALL | re.IGNORECASE)),
+        (('answer',), re.compile(r'Answer:\s*[A-Z]\.?\s*[-:\s]*(.*?)(?=\n\n|\n###|$)', re.DOTALL | re.IGNORECASE)),
+    )
     
     @staticmethod
     def _get_file_hash_and_content(path):
         """Get file hash and content - reused from your main.py."""
         try:
-            with open(path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            file_hash = hashlib.md5(content.encode()).hexdigest()
+            with metrics.stage('read_hash'):
+                with open(path, 'r', encoding='utf-8') as file:
+                    content = file.read()
+                file_hash = hashlib.md5(content.encode()).hexdigest()
             return file_hash, content
         except Exception as e:
             logger.error(f"Error reading file {path}: {e}")
             return None, None
     
+    @staticmethod
+    def _stat_signature(path):
+        """Cheap freshness signature for a file: (mtime_ns, size, inode)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @staticmethod
+    def get_cache_stats():
+        """Snapshot of the in-process quiz cache counters."""
+        with PWAQuizLoader._cache_lock:
+            stats = dict(PWAQuizLoader._cache_stats)
+            stats["entries"] = len(PWAQuizLoader._cache)
+            stats["bytes"] = PWAQuizLoader._cache_bytes
+            stats["max_bytes"] = PWAQuizLoader._CACHE_MAX_BYTES
+        return stats
+
+    @staticmethod
+    def clear_cache():
+        """Drop every in-process cache entry; the disk cache is left alone."""
+        with PWAQuizLoader._cache_lock:
+            PWAQuizLoader._cache.clear()
+            PWAQuizLoader._cache_bytes = 0
+
     @staticmethod
     def analyze_investigation_variations(content):
         """Analyze Investigation section variations - from your main.py."""
@@ -69,11 +623,314 @@ class PWAQuizLoader:
             variations[variation] = variations.get(variation, 0) + 1
             total_count += 1
         
-        logger.info(f"Found {total_count} Investigation sections with {len(variations)} variations")
+        if parser_trace.enabled:
+            parser_trace.log("Found %s Investigation sections with %s variations", total_count, len(variations))
         return variations
+
+    @staticmethod
+    def trace_parse(content):
+        """Parse ``content`` serially while capturing the parser trace.
+
+        Returns ``(questions, trace_lines)``. Runs in the calling thread so the
+        capture sees every block, and leaves the quiz caches untouched.
+        """
+        content = content.strip()
+        with parser_trace.capture() as records:
+            PWAQuizLoader.analyze_investigation_variations(content)
+            blocks = list(PWAQuizLoader._iter_question_blocks(content))
+            if not blocks:
+                for format_name in PWAQuizLoader._detect_question_formats(content):
+                    parser_trace.log("Re-parsing with %s conversion", format_name)
+                    blocks = list(PWAQuizLoader._iter_question_blocks(
+                        PWAQuizLoader._normalize_question_format(content, format_name)
+                    ))
+                    if blocks:
+                        break
+            questions = []
+            for block, specialty in blocks:
+                q = PWAQuizLoader._parse_question(block, specialty)
+                if q:
+                    questions.append(q)
+        return questions, ParserTrace.format_records(records)
     
     @staticmethod
     def _parse_question(block, specialty):
+        """Parse a markdown question block with the configured parser engine."""
+        if PWAQuizLoader.PARSER_ENGINE == 'legacy':
+            return PWAQuizLoader._parse_question_legacy(block, specialty)
+        return PWAQuizLoader._parse_question_compiled(block, specialty)
+
+    @staticmethod
+    def _parse_question_compiled(block, specialty):
+        """Parse a markdown question block in a single classification pass.
+
+        Returns the same dict as ``_parse_question_legacy``. The block is split
+        into paragraphs once, each paragraph is classified once (investigations,
+        image, text) and the tail lines are scanned once for options, so every
+        precompiled pattern runs at most once per paragraph or line.
+        """
+        if not block or not block.strip().startswith('###'):
+            return None
+
+        m = PWAQuizLoader._HEADER_RE.match(block)
+        if not m:
+            return None
+
+        num, title, rest = m.groups()
+        parts = []
+        for part in PWAQuizLoader._PARAGRAPH_SPLIT_RE.split(rest):
+            part = part.strip()
+            if part:
+                parts.append(part)
+        if parser_trace.enabled:
+            parser_trace.log("Question %s: Split into %s parts", num, len(parts))
+
+        # Classify paragraphs: the first investigations section, image-only sections
+        kinds = []
+        investigation_index = None
+        investigations = ""
+        for i, part in enumerate(parts):
+            if investigation_index is None and PWAQuizLoader._INVESTIGATION_RE.search(part):
+                investigation_index = i
+                investigations = PWAQuizLoader._INVESTIGATION_RE.sub('', part).strip()
+                kinds.append('investigations')
+            elif PWAQuizLoader._IMAGE_ONLY_RE.match(part):
+                kinds.append('image')
+            else:
+                kinds.append('text')
+
+        scenario = parts[0] if parts else ""
+        prompt = ""
+        image = ""
+        tail_start = 1
+
+        # A first section that already holds options is the prompt, not the scenario
+        prompt_from_first_section = bool(parts) and bool(PWAQuizLoader._FIRST_SECTION_OPTION_RE.search(parts[0]))
+        if prompt_from_first_section:
+            scenario = ""
+            prompt = parts[0]
+
+        if investigation_index is not None:
+            if investigation_index + 1 < len(parts):
+                prompt, image, tail_start = PWAQuizLoader._split_prompt_section(
+                    num, parts, kinds, investigation_index + 1, prompt
+                )
+        elif len(parts) >= 2 and not prompt_from_first_section:
+            prompt, image, tail_start = PWAQuizLoader._split_prompt_section(num, parts, kinds, 1, prompt)
+
+        tail_parts = parts[tail_start:]
+        tail_content = '\n\n'.join(tail_parts)
+
+        answer_match = PWAQuizLoader._ANSWER_RE.search(tail_content)
+        answer_letter = answer_match.group(1).upper() if answer_match else None
+
+        options = []
+        for part in tail_parts:
+            for line in part.split('\n'):
+                option_match = PWAQuizLoader._OPTION_LINE_RE.match(line.strip())
+                if option_match:
+                    options.append(f"{option_match.group(1)}) {option_match.group(2).strip()}")
+
+        explanation = PWAQuizLoader._find_explanation(tail_content)
+        if explanation:
+            explanations = [f"Explanation: {explanation}"]
+        else:
+            logger.warning("No explanation found for question %s. Tail content sample: %s", num, tail_content[:300])
+            explanations = []
+
+        if PWAQuizLoader._IMAGE_ONLY_RE.match(prompt.strip()):
+            prompt = PWAQuizLoader._prompt_before_options(num, parts, tail_start, scenario, prompt)
+
+        # Options written inside the prompt section take precedence over tail options
+        if prompt:
+            option_lines = []
+            non_option_lines = []
+            for line in prompt.split('\n'):
+                line_stripped = line.strip()
+                if PWAQuizLoader._PROMPT_OPTION_RE.match(line_stripped):
+                    option_lines.append(line_stripped)
+                else:
+                    non_option_lines.append(line)
+            if option_lines:
+                options = option_lines
+                prompt = '\n'.join(non_option_lines).strip()
+
+        options = [PWAQuizLoader._clean_option(opt) for opt in options]
+
+        correct_answer = None
+        if answer_letter:
+            correct_answer = ord(answer_letter) - ord('A')
+            for idx, opt in enumerate(options):
+                label_match = PWAQuizLoader._OPTION_LINE_RE.match(opt)
+                if label_match and label_match.group(1).upper() == answer_letter:
+                    correct_answer = idx
+                    break
+
+        if correct_answer is None and options:
+            logger.warning("No correct answer found for question %s. Sample content: %s...", num, tail_content[:200])
+
+        if parser_trace.enabled:
+            parser_trace.log(
+                "Parsed question %s: title=%r, prompt=%r, image=%r, options=%s, correct_answer=%s, explanations=%s",
+                num, title.strip()[:50], prompt[:80], image, len(options), correct_answer, len(explanations)
+            )
+
+        return {
+            'id': int(num),
+            'title': title.strip(),
+            'specialty': specialty,
+            'scenario': scenario,
+            'investigations': investigations,
+            'image': image,  # Separate image field for frontend
+            'prompt': prompt,
+            'options': options,
+            'correct_answer': correct_answer,
+            'explanations': explanations
+        }
+
+    @staticmethod
+    def _split_prompt_section(num, parts, kinds, index, prompt):
+        """Resolve the section following the scenario/investigations.
+
+        Returns ``(prompt, image, tail_start)``. An image-only section moves the
+        prompt to the next section; an image embedded above the question text
+        is dropped from the prompt.
+        """
+        section = parts[index]
+        if kinds[index] == 'image':
+            if index + 1 < len(parts):
+                return parts[index + 1], section, index + 2
+            logger.warning("Question %s: Image detected but no section after image", num)
+            return prompt, section, index + 1
+
+        if '[IMAGE:' not in section and '![Image](' not in section:
+            return section, "", index + 1
+
+        found_image = False
+        question_lines = []
+        for line in section.split('\n'):
+            if PWAQuizLoader._IMAGE_ONLY_RE.match(line.strip()):
+                found_image = True
+            elif found_image or line.strip():
+                question_lines.append(line)
+
+        if found_image and question_lines:
+            return '\n'.join(question_lines).strip(), "", index + 1
+        return section, "", index + 1
+
+    @staticmethod
+    def _prompt_before_options(num, parts, tail_start, scenario, prompt):
+        """Recover a question sentence when the prompt is only an image reference."""
+        logger.warning("Question %s: Prompt is still just an image after parsing! Looking for question before options...", num)
+        question_found = False
+        for i in range(tail_start, len(parts)):
+            part = parts[i]
+            if PWAQuizLoader._FALLBACK_OPTION_RE.search(part):
+                question_lines = []
+                for line in part.split('\n'):
+                    if PWAQuizLoader._FALLBACK_OPTION_RE.match(line):
+                        break
+                    if line.strip():
+                        question_lines.append(line.strip())
+
+                if question_lines:
+                    potential_question = ' '.join(question_lines).strip()
+                    if potential_question.endswith('?') or len(potential_question) > 10:
+                        prompt = potential_question
+                        question_found = True
+                        break
+
+            # Mirrors the legacy engine, which re-checks the scenario after each section
+            if not question_found and scenario.strip().endswith('?'):
+                sentences = PWAQuizLoader._SENTENCE_SPLIT_RE.split(scenario)
+                if sentences and sentences[-1].strip().endswith('?'):
+                    prompt = sentences[-1].strip()
+                    question_found = True
+
+            if not question_found:
+                prompt = ""
+        return prompt
+
+    @staticmethod
+    def _find_explanation(tail_content):
+        """Return the explanation text from a question tail, or an empty string."""
+        present = set()
+        for keyword_match in PWAQuizLoader._EXPLANATION_KEYWORD_RE.finditer(tail_content):
+            present.add(keyword_match.lastgroup)
+            if len(present) == 3:
+                break
+
+        for keywords, pattern in PWAQuizLoader._EXPLANATION_PATTERNS:
+            if present.isdisjoint(keywords):
+                continue
+            explanation_match = pattern.search(tail_content)
+            if explanation_match:
+                return explanation_match.group(1).strip()
+        return ""
+
+    @staticmethod
+    def _clean_option(opt):
+        """Normalise an option to ``'A) text'``, stripping nested secondary labels."""
+        text = str(opt).strip()
+        label_match = PWAQuizLoader._OPTION_LINE_RE.match(text)
+        if label_match:
+            label = label_match.group(1).upper()
+            remainder = label_match.group(2).strip()
+        else:
+            label = None
+            remainder = text
+
+        while True:
+            nested = (
+                PWAQuizLoader._NESTED_LABEL_RE.match(remainder)
+                or PWAQuizLoader._NESTED_LABEL_SPACED_RE.match(remainder)
+            )
+            if not nested:
+                break
+            remainder = nested.group(2).strip()
+
+        return f"{label}) {remainder}" if label else remainder
+
+    @staticmethod
+    def _iter_question_blocks(content):
+        """Yield ``(block, specialty)`` for every question block in ``content``."""
+        specialty_markers = [(0, "Uncategorized")]
+        for m in PWAQuizLoader.SPECIALTY_HEADER_RE.finditer(content):
+            specialty_markers.append((m.start(), m.group(1).strip()))
+        specialty_markers.sort(key=lambda x: x[0])
+        positions = [pos for pos, _ in specialty_markers]
+
+        for qm in PWAQuizLoader.QUESTION_RE.finditer(content):
+            yield qm.group(1), specialty_markers[bisect.bisect_right(positions, qm.start()) - 1][1]
+
+    @staticmethod
+    def diff_parser_engines(content):
+        """Parse ``content`` with both engines and report questions that differ.
+
+        Used to validate the compiled engine against the legacy parser on a
+        real corpus; an empty list means both engines agree on every block.
+        """
+        diffs = []
+        for block, specialty in PWAQuizLoader._iter_question_blocks(content):
+            legacy = PWAQuizLoader._parse_question_legacy(block, specialty)
+            compiled = PWAQuizLoader._parse_question_compiled(block, specialty)
+            if legacy == compiled:
+                continue
+            legacy_fields = legacy or {}
+            compiled_fields = compiled or {}
+            diffs.append({
+                'block': block[:200],
+                'fields': sorted(
+                    key for key in set(legacy_fields) | set(compiled_fields)
+                    if legacy_fields.get(key) != compiled_fields.get(key)
+                ),
+                'legacy': legacy,
+                'compiled': compiled,
+            })
+        return diffs
+
+    @staticmethod
+    def _parse_question_legacy(block, specialty):
         """Parse a markdown question block - reused from your main.py with modifications."""
         if not block or not block.strip().startswith('###'):
             return None
@@ -86,13 +943,10 @@ class PWAQuizLoader:
         # Remove maxsplit limitation to capture all sections including image and question after image
         parts = [p.strip() for p in re.split(r'\n\s*\n', rest) if p.strip()]
         
-        logger.debug(f"Question {num}: Split into {len(parts)} parts")
-        for idx, part in enumerate(parts):
-            logger.debug(
-                f"Question {num}: parts[{idx}] = '{part[:100]}...'"
-                if len(part) > 100
-                else f"Question {num}: parts[{idx}] = '{part}'"
-            )
+        if parser_trace.enabled:
+            parser_trace.log("Question %s: Split into %s parts", num, len(parts))
+            for idx, part in enumerate(parts):
+                parser_trace.log("Question %s: parts[%s] = '%s%s'", num, idx, part[:100], '...' if len(part) > 100 else '')
 
         scenario = parts[0] if parts else ""
         investigation_index = None
@@ -105,9 +959,8 @@ class PWAQuizLoader:
         prompt_from_first_section = False
         if parts:
             if re.search(r'^\s*[A-Z][\.)]\s+', parts[0], re.MULTILINE):
-                logger.debug(
-                    f"Question {num}: Detected options in first section; treating parts[0] as prompt"
-                )
+                if parser_trace.enabled:
+                    parser_trace.log("Question %s: Detected options in first section; treating parts[0] as prompt", num)
                 scenario = ""
                 prompt = parts[0]
                 tail_start = 1
@@ -140,28 +993,23 @@ class PWAQuizLoader:
         if investigation_index is not None:
             if investigation_index + 1 < len(parts):
                 potential_prompt = parts[investigation_index + 1]
-                logger.debug(
-                    f"Question {num}: Section after investigations: '{potential_prompt[:100]}'"
-                )
+                if parser_trace.enabled:
+                    parser_trace.log("Question %s: Section after investigations: '%s'", num, potential_prompt[:100])
                 
                 # Check if this section is just an image reference
                 # Pattern: [IMAGE: filename.png] or ![Image](__REF__:filename)
                 is_image_only = re.match(r'^\s*(\[IMAGE:\s*[^\]]+\]|!\[Image\]\([^)]+\))\s*$', potential_prompt.strip())
                 
                 if is_image_only:
-                    logger.debug("Question %s: Detected image-only section", num)
-                    logger.debug(
-                        "Question %s: len(parts)=%s, investigation_index=%s",
-                        num,
-                        len(parts),
-                        investigation_index,
-                    )
-                    logger.debug(
-                        "Question %s: Checking if investigation_index + 2 (%s) < len(parts) (%s)",
-                        num,
-                        investigation_index + 2,
-                        len(parts),
-                    )
+                    if parser_trace.enabled:
+                        parser_trace.log("Question %s: Detected image-only section", num)
+                        parser_trace.log("Question %s: len(parts)=%s, investigation_index=%s", num, len(parts), investigation_index)
+                        parser_trace.log(
+                            "Question %s: Checking if investigation_index + 2 (%s) < len(parts) (%s)",
+                            num,
+                            investigation_index + 2,
+                            len(parts),
+                        )
                     # Store the image reference separately
                     image = potential_prompt.strip()
                     
@@ -169,9 +1017,8 @@ class PWAQuizLoader:
                         # The actual question comes AFTER the image in a separate section
                         prompt = parts[investigation_index + 2]
                         tail_start = investigation_index + 3
-                        logger.debug(
-                            f"Question {num}: Using section after image as prompt: '{prompt[:100]}'"
-                        )
+                        if parser_trace.enabled:
+                            parser_trace.log("Question %s: Using section after image as prompt: '%s'", num, prompt[:100])
                     else:
                         logger.warning(f"Question {num}: Image detected but no section after image (investigation_index={investigation_index}, len(parts)={len(parts)})")
                         tail_start = investigation_index + 2
@@ -201,9 +1048,8 @@ class PWAQuizLoader:
                     if found_image and question_lines:
                         # Found image embedded with question - separate them
                         prompt = '\n'.join(question_lines).strip()
-                        logger.debug(
-                            f"Question {num}: Separated embedded image from question: '{prompt[:100]}'"
-                        )
+                        if parser_trace.enabled:
+                            parser_trace.log("Question %s: Separated embedded image from question: '%s'", num, prompt[:100])
                         tail_start = investigation_index + 2
                     else:
                         # No image found, use as-is
@@ -219,50 +1065,56 @@ class PWAQuizLoader:
             # complex logic that would overwrite prompt using parts[1]. The
             # correct flow is to treat parts[1:] as tail (answer/explanation).
             if 'prompt_from_first_section' in locals() and prompt_from_first_section:
-                logger.debug(
-                    f"Question {num}: prompt came from first section, skipping parts[1] processing"
-                )
+                if parser_trace.enabled:
+                    parser_trace.log("Question %s: prompt came from first section, skipping parts[1] processing", num)
             else:
                 potential_prompt = parts[1]
-                logger.debug(
-                    f"Question {num}: Section after scenario: '{potential_prompt[:100]}'"
-                )
-                logger.debug(
-                    f"Question {num}: DEBUG - len(parts)={len(parts)}, parts array: {[p[:50] + '...' if len(p) > 50 else p for p in parts]}"
-                )
+                if parser_trace.enabled:
+                    parser_trace.log("Question %s: Section after scenario: '%s'", num, potential_prompt[:100])
+                    parser_trace.log(
+                        "Question %s: DEBUG - len(parts)=%s, parts array: %s",
+                        num,
+                        len(parts),
+                        [p[:50] + '...' if len(p) > 50 else p for p in parts],
+                    )
             
             # Check if the section after scenario is an image reference
             
                 is_image_only = re.match(r'^\s*(\[IMAGE:\s*[^\]]+\]|!\[Image\]\([^)]+\))\s*$', potential_prompt.strip())
                 
                 if is_image_only:
-                    logger.debug(
-                        f"Question {num}: Detected image-only section after scenario"
-                    )
+                    if parser_trace.enabled:
+                        parser_trace.log("Question %s: Detected image-only section after scenario", num)
                     # Store the image reference separately
                     image = potential_prompt.strip()
-                    logger.debug(f"Question {num}: DEBUG - Stored image reference: '{image}'")
+                    if parser_trace.enabled:
+                        parser_trace.log("Question %s: DEBUG - Stored image reference: '%s'", num, image)
                     
                     if len(parts) >= 3:
                         # The actual question comes AFTER the image in a separate section
-                        logger.debug(f"Question {num}: DEBUG - BEFORE assignment: prompt='{prompt}'")
-                        logger.debug(f"Question {num}: DEBUG - parts[2] content: '{parts[2]}'")
+                        if parser_trace.enabled:
+                            parser_trace.log("Question %s: DEBUG - BEFORE assignment: prompt='%s'", num, prompt)
+                            parser_trace.log("Question %s: DEBUG - parts[2] content: '%s'", num, parts[2])
                         prompt = parts[2]
-                        logger.debug(f"Question {num}: DEBUG - AFTER assignment: prompt='{prompt}'")
+                        if parser_trace.enabled:
+                            parser_trace.log("Question %s: DEBUG - AFTER assignment: prompt='%s'", num, prompt)
                         tail_start = 3
-                        logger.debug(
-                            f"Question {num}: Using section after image as prompt: '{prompt[:100]}'"
-                        )
+                        if parser_trace.enabled:
+                            parser_trace.log("Question %s: Using section after image as prompt: '%s'", num, prompt[:100])
                     else:
                         logger.warning(f"Question {num}: Image detected but no section after image")
                         tail_start = 2
                 else:
                     # Not image-only, but check if image is embedded in the text
-                    logger.debug(
-                        f"Question {num}: Checking for embedded image in section (length {len(potential_prompt)} chars)"
-                    )
+                    if parser_trace.enabled:
+                        parser_trace.log(
+                            "Question %s: Checking for embedded image in section (length %s chars)",
+                            num,
+                            len(potential_prompt),
+                        )
                     section_lines = potential_prompt.split('\n')
-                    logger.debug(f"Question {num}: Section has {len(section_lines)} lines")
+                    if parser_trace.enabled:
+                        parser_trace.log("Question %s: Section has %s lines", num, len(section_lines))
                     image_lines = []
                     question_lines = []
                     found_image = False
@@ -270,13 +1122,13 @@ class PWAQuizLoader:
                     for idx, line in enumerate(section_lines):
                         is_image_line = re.match(r'^\s*(\[IMAGE:\s*[^\]]+\]|!\[Image\]\([^)]+\))\s*$', line.strip())
                         if is_image_line:
-                            logger.debug(f"Question {num}: Line {idx} is image: '{line.strip()[:80]}'")
+                            if parser_trace.enabled:
+                                parser_trace.log("Question %s: Line %s is image: '%s'", num, idx, line.strip()[:80])
                             image_lines.append(line)
                             found_image = True
                         elif found_image:
-                            logger.debug(
-                                f"Question {num}: Line {idx} after image: '{line.strip()[:80]}'"
-                            )
+                            if parser_trace.enabled:
+                                parser_trace.log("Question %s: Line %s after image: '%s'", num, idx, line.strip()[:80])
                             question_lines.append(line)
                         elif not found_image and not line.strip():
                             continue
@@ -285,17 +1137,17 @@ class PWAQuizLoader:
                     
                     if found_image and question_lines:
                         prompt = '\n'.join(question_lines).strip()
-                        logger.debug(
-                            f"Question {num}: Separated embedded image from question: '{prompt[:100]}'"
-                        )
+                        if parser_trace.enabled:
+                            parser_trace.log("Question %s: Separated embedded image from question: '%s'", num, prompt[:100])
                         tail_start = 2
                     else:
-                        logger.debug(
-                            "Question %s: No embedded image found or no question lines after image (found_image=%s, question_lines=%s)",
-                            num,
-                            found_image,
-                            len(question_lines),
-                        )
+                        if parser_trace.enabled:
+                            parser_trace.log(
+                                "Question %s: No embedded image found or no question lines after image (found_image=%s, question_lines=%s)",
+                                num,
+                                found_image,
+                                len(question_lines),
+                            )
                         prompt = potential_prompt
                         tail_start = 2
 
@@ -305,7 +1157,8 @@ class PWAQuizLoader:
         
         # Combine all tail parts to search for answer
         tail_content = '\n\n'.join(parts[tail_start:])
-        logger.debug(f"Question {num} tail content (first 500 chars): {tail_content[:500]}")
+        if parser_trace.enabled:
+            parser_trace.log("Question %s tail content (first 500 chars): %s", num, tail_content[:500])
         
         # Parse answer using flexible regex to handle both formats
         # Matches: **Answer:** A OR **Answer**: A OR **Ans:** A OR **Ans**: A
@@ -331,7 +1184,13 @@ class PWAQuizLoader:
             else:
                 correct_answer = ord(answer_letter) - ord('A')
 
-        logger.debug(f"Answer detection: found pattern '{answer_match.group(0) if answer_match else 'None'}' -> letter={answer_letter}, index={correct_answer}")
+        if parser_trace.enabled:
+            parser_trace.log(
+                "Answer detection: found pattern '%s' -> letter=%s, index=%s",
+                answer_match.group(0) if answer_match else 'None',
+                answer_letter,
+                correct_answer,
+            )
         
         for part in parts[tail_start:]:
             lines = part.strip().split('\n')
@@ -374,7 +1233,8 @@ class PWAQuizLoader:
             explanation_match = re.search(pattern, tail_content, re.DOTALL | re.IGNORECASE)
             if explanation_match:
                 explanation = explanation_match.group(1).strip()
-                logger.debug(f"Found explanation for question {num} using pattern: {explanation[:100]}...")
+                if parser_trace.enabled:
+                    parser_trace.log("Found explanation for question %s using pattern: %s...", num, explanation[:100])
                 break
         
         if explanation:
@@ -387,8 +1247,9 @@ class PWAQuizLoader:
         # This is common when question and options are in the same markdown section
         
         # SIMPLER LOGIC: If prompt is just an image, find the question sentence before the options
-        logger.debug(f"Question {num}: DEBUG - About to check fallback. Current prompt value: '{prompt}'")
-        logger.debug(f"Question {num}: DEBUG - tail_start={tail_start}, len(parts)={len(parts)}")
+        if parser_trace.enabled:
+            parser_trace.log("Question %s: DEBUG - About to check fallback. Current prompt value: '%s'", num, prompt)
+            parser_trace.log("Question %s: DEBUG - tail_start=%s, len(parts)=%s", num, tail_start, len(parts))
         if re.match(r'^\s*(\[IMAGE:\s*[^\]]+\]|!\[Image\]\([^)]+\))\s*$', prompt.strip()):
             logger.warning(f"Question {num}: Prompt is still just an image after parsing! Looking for question before options...")
             
@@ -396,10 +1257,12 @@ class PWAQuizLoader:
             question_found = False
             for i in range(tail_start, len(parts)):
                 part = parts[i]
-                logger.debug(f"Question {num}: Checking parts[{i}] for options/question: '{part[:100]}'")
+                if parser_trace.enabled:
+                    parser_trace.log("Question %s: Checking parts[%s] for options/question: '%s'", num, i, part[:100])
                 # Check if this part contains options (starts with A. or A))
                 if re.search(r'^\s*[A-Z][.)]\s', part, re.MULTILINE):
-                    logger.debug(f"Question {num}: Found options in parts[{i}]")
+                    if parser_trace.enabled:
+                        parser_trace.log("Question %s: Found options in parts[%s]", num, i)
                     # The question should be right before the first option
                     # Split by newlines and find the last sentence before options
                     lines = part.split('\n')
@@ -418,13 +1281,15 @@ class PWAQuizLoader:
                         if potential_question.endswith('?'):
                             prompt = potential_question
                             question_found = True
-                            logger.debug(f"Question {num}: Found question before options: '{prompt}'")
+                            if parser_trace.enabled:
+                                parser_trace.log("Question %s: Found question before options: '%s'", num, prompt)
                             break
                         # Even if no question mark, use the last sentence before options
                         elif len(potential_question) > 10:
                             prompt = potential_question
                             question_found = True
-                            logger.debug(f"Question {num}: Using text before options as question: '{prompt}'")
+                            if parser_trace.enabled:
+                                parser_trace.log("Question %s: Using text before options as question: '%s'", num, prompt)
                             break
             
                 if not question_found:
@@ -435,16 +1300,19 @@ class PWAQuizLoader:
                         sentences = re.split(r'[.!]\s+', scenario)
                         if sentences and sentences[-1].strip().endswith('?'):
                             prompt = sentences[-1].strip()
-                            logger.debug(f"Question {num}: Extracted question from end of scenario: '{prompt}'")
+                            if parser_trace.enabled:
+                                parser_trace.log("Question %s: Extracted question from end of scenario: '%s'", num, prompt)
                             question_found = True
 
                 if not question_found:
                     # Do NOT invent a prompt. Leave prompt empty to avoid misleading
                     # content being injected into question data.
                     prompt = ""
-                    logger.debug(f"Question {num}: No explicit prompt found; leaving prompt empty")
+                    if parser_trace.enabled:
+                        parser_trace.log("Question %s: No explicit prompt found; leaving prompt empty", num)
         else:
-            logger.debug(f"Question {num}: DEBUG - Fallback check passed, prompt is NOT just an image")
+            if parser_trace.enabled:
+                parser_trace.log("Question %s: DEBUG - Fallback check passed, prompt is NOT just an image", num)
         
         prompt_lines = prompt.split('\n')
         option_lines = []
@@ -468,7 +1336,8 @@ class PWAQuizLoader:
                 options = option_lines
             # Clean the prompt to only contain the question text
             prompt = '\n'.join(non_option_lines).strip()
-            logger.debug(f"Question {num}: Extracted {len(option_lines)} options from prompt section")
+            if parser_trace.enabled:
+                parser_trace.log("Question %s: Extracted %s options from prompt section", num, len(option_lines))
 
         # Normalise option strings but PRESERVE the primary label (A, B, C...) so UI shows 'A) text'
         cleaned_options = []
@@ -509,7 +1378,8 @@ class PWAQuizLoader:
             cleaned_options.append(cleaned)
 
         options = cleaned_options
-        logger.debug(f"Question {num}: Cleaned options: {options}")
+        if parser_trace.enabled:
+            parser_trace.log("Question %s: Cleaned options: %s", num, options)
 
         # Recompute correct_answer index by matching the detected answer_letter to option labels
         if answer_letter:
@@ -524,17 +1394,27 @@ class PWAQuizLoader:
             else:
                 # fallback to alphabetical mapping
                 correct_answer = ord(answer_letter) - ord('A')
-            logger.debug(f"Question {num}: Recomputed correct_answer from letter '{answer_letter}' -> index {correct_answer}")
+            if parser_trace.enabled:
+                parser_trace.log("Question %s: Recomputed correct_answer from letter '%s' -> index %s", num, answer_letter, correct_answer)
 
-        logger.debug(f"Parsed question {num}: title='{title[:50] if len(title) > 50 else title}', prompt='{prompt[:80] if prompt else 'None'}', options={len(options)}, correct_answer={correct_answer}")
+        if parser_trace.enabled:
+            parser_trace.log(
+                "Parsed question %s: title='%s', prompt='%s', options=%s, correct_answer=%s",
+                num,
+                title[:50] if len(title) > 50 else title,
+                prompt[:80] if prompt else 'None',
+                len(options),
+                correct_answer,
+            )
         if correct_answer is None and options:
             logger.warning(f"No correct answer found for question {num}. Sample content: {tail_content[:200]}...")
 
-        logger.debug(f"Question {num}: DEBUG - FINAL VALUES BEFORE RETURN:")
-        logger.debug(f"Question {num}: DEBUG - scenario='{scenario[:100] if len(scenario) > 100 else scenario}'")
-        logger.debug(f"Question {num}: DEBUG - prompt='{prompt}'")
-        logger.debug(f"Question {num}: DEBUG - image='{image}'")
-        logger.debug(f"Question {num}: DEBUG - investigations='{investigations[:50] if investigations else 'None'}'")
+        if parser_trace.enabled:
+            parser_trace.log("Question %s: DEBUG - FINAL VALUES BEFORE RETURN:", num)
+            parser_trace.log("Question %s: DEBUG - scenario='%s'", num, scenario[:100] if len(scenario) > 100 else scenario)
+            parser_trace.log("Question %s: DEBUG - prompt='%s'", num, prompt)
+            parser_trace.log("Question %s: DEBUG - image='%s'", num, image)
+            parser_trace.log("Question %s: DEBUG - investigations='%s'", num, investigations[:50] if investigations else 'None')
 
         return {
             'id': int(num),
@@ -553,149 +1433,48 @@ class PWAQuizLoader:
     def parse_markdown_content(content, filename="uploaded_quiz"):
         """Parse markdown content directly without file system."""
         try:
-            logger.debug(f"Starting to parse quiz content from {filename}, length: {len(content)} characters")
+            if parser_trace.enabled:
+                parser_trace.log("Starting to parse quiz content from %s, length: %s characters", filename, len(content))
             
             # Clean up the content first
             content = content.strip()
             
-            # Log some debugging info about the content structure
-            lines_with_hash = [line.strip() for line in content.split('\n') if line.strip().startswith('###')]
-            logger.debug(f"Found {len(lines_with_hash)} lines starting with '###': {lines_with_hash[:5]}")
-            
-            if len(lines_with_hash) == 0:
-                # Maybe the content uses different formatting - check for other patterns
-                lines_with_numbers = [line.strip() for line in content.split('\n') if re.match(r'^\d+\.', line.strip())]
-                logger.debug(f"Found {len(lines_with_numbers)} lines starting with numbers: {lines_with_numbers[:3]}")
-                
-                # Try to detect other question patterns
-                question_patterns = [
-                    r'^\d+\.\s+',  # 1. Question
-                    r'^Q\d+[.:]\s*',  # Q1: Question
-                    r'^Question\s+\d+',  # Question 1
-                    r'##\s*\d+',  # ## 1
-                ]
-                
-                for pattern in question_patterns:
-                    matches = re.findall(pattern, content, re.MULTILINE)
-                    if matches:
-                        logger.debug(f"Found {len(matches)} matches for pattern '{pattern}': {matches[:3]}")
-                        break
-            
-            # Debug: Look for question patterns
-            question_pattern_matches = re.findall(r'###\s*\d+.*?(?=###\s*\d+|\Z)', content, re.DOTALL)
-            logger.debug(f"Found {len(question_pattern_matches)} question blocks using QUESTION_RE pattern")
-            
-            if len(question_pattern_matches) > 0:
-                logger.debug(f"First question block preview (200 chars): {question_pattern_matches[0][:200]}...")
-                if len(question_pattern_matches) > 1:
-                    logger.debug(f"Second question block preview (200 chars): {question_pattern_matches[1][:200]}...")
-            
-            # Analyze investigation variations
-            PWAQuizLoader.analyze_investigation_variations(content)
+            # Investigation section stats are a diagnostic only; skip the scan unless tracing
+            if parser_trace.enabled:
+                PWAQuizLoader.analyze_investigation_variations(content)
 
-            questions = []
-            specialty_markers = [(0, "Uncategorized")]
-            
-            # Find specialty headers
-            for m in PWAQuizLoader.SPECIALTY_HEADER_RE.finditer(content):
-                specialty_markers.append((m.start(), m.group(1).strip()))
-            specialty_markers.sort(key=lambda x: x[0])
-            logger.debug(f"Found {len(specialty_markers)} specialty markers: {[s[1] for s in specialty_markers]}")
-
-            def find_specialty(pos: int) -> str:
-                lo, hi = 0, len(specialty_markers) - 1
-                best = 0
-                while lo <= hi:
-                    mid = (lo + hi) // 2
-                    if specialty_markers[mid][0] <= pos:
-                        best = mid
-                        lo = mid + 1
-                    else:
-                        hi = mid - 1
-                return specialty_markers[best][1]
-
-            # Parse questions
-            question_count = 0
-            failed_blocks = 0
-            for qm in PWAQuizLoader.QUESTION_RE.finditer(content):
-                block = qm.group(1)
-                specialty = find_specialty(qm.start())
-                logger.debug(f"Processing question block {question_count + 1} (specialty: {specialty})")
-                logger.debug(f"Block content: {block[:200]}...")
-                
-                q = PWAQuizLoader._parse_question(block, specialty)
-                if q:
-                    questions.append(q)
-                    question_count += 1
-                    logger.debug(f"✓ Successfully parsed question {question_count}: ID={q['id']}, title='{q['title'][:50]}...'")
-                else:
-                    failed_blocks += 1
-                    logger.warning(f"✗ Failed to parse question block {question_count + failed_blocks}. Block start: {block[:100]}...")
+            questions = PWAQuizLoader._parse_formatted_content(content)
+
+            if len(questions) == 0:
+                # Not in ### format: classify the document once and retry on a
+                # copy normalized to ### headers in a single substitution
+                for format_name in PWAQuizLoader._detect_question_formats(content):
+                    if parser_trace.enabled:
+                        parser_trace.log("Attempting to re-parse with %s conversion...", format_name)
+                    questions = PWAQuizLoader._parse_formatted_content(
+                        PWAQuizLoader._normalize_question_format(content, format_name)
+                    )
+                    if questions:
+                        if parser_trace.enabled:
+                            parser_trace.log("✓ Alternative parsing succeeded with %s questions!", len(questions))
+                        break
 
-            logger.debug(f"Parsing complete: {len(questions)} questions successfully parsed, {failed_blocks} blocks failed")
-            
             if len(questions) == 0:
                 logger.error(f"NO QUESTIONS PARSED! Debug info for {filename}:")
                 logger.error(f"Content has ### headers: {'###' in content}")
                 logger.error(f"QUESTION_RE pattern: {PWAQuizLoader.QUESTION_RE.pattern}")
                 logger.error(f"Content length: {len(content)} characters")
                 logger.error(f"First 1000 chars: {content[:1000]}")
-                
-                # Try alternative parsing approach
-                logger.debug("Attempting alternative parsing approaches...")
-                
-                # Try a more flexible question pattern
-                alternative_patterns = [
-                    r'(\d+\.\s+.*?)(?=\d+\.\s+|\Z)',  # 1. Question format
-                    r'(Q\d+[.:]\s*.*?)(?=Q\d+[.:]\s*|\Z)',  # Q1: Question format
-                    r'(Question\s+\d+.*?)(?=Question\s+\d+|\Z)',  # Question 1 format
-                ]
-                
-                for pattern_name, pattern in [("numbered", alternative_patterns[0]), ("Q-format", alternative_patterns[1]), ("Question-format", alternative_patterns[2])]:
-                    alt_matches = re.findall(pattern, content, re.DOTALL | re.IGNORECASE)
-                    logger.debug(f"Alternative pattern '{pattern_name}' found {len(alt_matches)} matches")
-                    if alt_matches:
-                        logger.debug(f"Sample match: {alt_matches[0][:200]}...")
-                        # Try to parse with modified content
-                        modified_content = content
-                        # Convert to ### format
-                        for i, match in enumerate(alt_matches, 1):
-                            if pattern_name == "numbered":
-                                # Convert "1. Question" to "### 1. Question"
-                                modified_content = re.sub(r'^(\d+\.\s+)', r'### \1', modified_content, flags=re.MULTILINE)
-                            elif pattern_name == "Q-format":
-                                # Convert "Q1: Question" to "### 1. Question"
-                                modified_content = re.sub(r'^Q(\d+)[.:]\s*', r'### \1. ', modified_content, flags=re.MULTILINE)
-                            elif pattern_name == "Question-format":
-                                # Convert "Question 1" to "### 1."
-                                modified_content = re.sub(r'^Question\s+(\d+)', r'### \1.', modified_content, flags=re.MULTILINE)
-                        
-                        # Try parsing again with modified content
-                        if modified_content != content:
-                            logger.debug(f"Attempting to re-parse with {pattern_name} conversion...")
-                            alt_questions = []
-                            for qm in PWAQuizLoader.QUESTION_RE.finditer(modified_content):
-                                block = qm.group(1)
-                                specialty = find_specialty(qm.start())
-                                q = PWAQuizLoader._parse_question(block, specialty)
-                                if q:
-                                    alt_questions.append(q)
-                            
-                            if alt_questions:
-                                logger.debug(f"✓ Alternative parsing succeeded with {len(alt_questions)} questions!")
-                                questions = alt_questions
-                                break
-                
-                if len(questions) == 0:
-                    # Split by lines and look for numbered items
-                    lines = content.split('\n')
-                    question_lines = []
-                    for i, line in enumerate(lines):
-                        if re.match(r'^\s*###\s*\d+', line) or re.match(r'^\s*\d+\.', line):
-                            question_lines.append((i, line.strip()))
-                    
-                    logger.debug(f"Found {len(question_lines)} potential question lines: {question_lines[:5]}")
-            
+
+                # Split by lines and look for numbered items
+                lines = content.split('\n')
+                question_lines = []
+                for i, line in enumerate(lines):
+                    if re.match(r'^\s*###\s*\d+', line) or re.match(r'^\s*\d+\.', line):
+                        question_lines.append((i, line.strip()))
+
+                logger.debug("Found %s potential question lines: %s", len(question_lines), question_lines[:5])
+
             return questions
 
         except Exception as e:
@@ -705,239 +1484,2591 @@ class PWAQuizLoader:
             return []
 
     @staticmethod
-    def load_from_markdown(path: str):
-        """Load questions from markdown file - adapted from your main.py."""
-        try:
-            file_hash, content = PWAQuizLoader._get_file_hash_and_content(path)
-            if not content:
-                return []
+    def _parse_formatted_content(content):
+        """Parse the ``###`` question blocks of ``content`` (chunk-parallel for large banks)."""
+        questions = []
+        question_count = 0
+        failed_blocks = 0
+        blocks = list(PWAQuizLoader._iter_question_blocks(content))
+        if parser_trace.enabled:
+            parser_trace.log("Found %s question blocks using QUESTION_RE pattern", len(blocks))
+        for (block, specialty), q in zip(blocks, _parse_question_blocks(blocks, len(content))):
+            if q:
+                questions.append(q)
+                question_count += 1
+                if parser_trace.enabled:
+                    parser_trace.log("✓ Successfully parsed question %s: ID=%s, title='%s...'", question_count, q['id'], q['title'][:50])
+            else:
+                failed_blocks += 1
+                logger.warning("✗ Failed to parse question block %s. Block start: %s...", question_count + failed_blocks, block[:100])
 
-            with PWAQuizLoader._cache_lock:
-                cached = PWAQuizLoader._cache.get(path)
+        if parser_trace.enabled:
+            parser_trace.log("Parsing complete: %s questions successfully parsed, %s blocks failed", len(questions), failed_blocks)
+        return questions
+
+    @staticmethod
+    def _detect_question_formats(content):
+        """Alternative question formats present in ``content``, in preference order.
+
+        Only the first ``_FORMAT_SAMPLE_CHARS`` are scanned; the whole
+        document is searched only when the sample shows no known format.
+        """
+        sample = content[:PWAQuizLoader._FORMAT_SAMPLE_CHARS]
+        formats = [name for name, detect, _, _ in PWAQuizLoader._QUESTION_FORMATS if detect.search(sample)]
+        if not formats and len(content) > len(sample):
+            formats = [name for name, detect, _, _ in PWAQuizLoader._QUESTION_FORMATS if detect.search(content)]
+        logger.debug("Detected alternative question formats: %s", formats)
+        return formats
+
+    @staticmethod
+    def _normalize_question_format(content, format_name):
+        """Rewrite ``format_name`` question headers in ``content`` as ``### N.`` headers."""
+        for name, _, header, replacement in PWAQuizLoader._QUESTION_FORMATS:
+            if name == format_name:
+                return header.sub(replacement, content)
+        return content
+
+    @staticmethod
+    def _disk_cache_path(file_hash):
+        """Path of the disk cache entry for a content hash and parser version."""
+        filename = f"{file_hash}.{PWAQuizLoader.PARSER_ENGINE}.v{PWAQuizLoader._DISK_CACHE_VERSION}.marshal"
+        return os.path.join(PWAQuizLoader._DISK_CACHE_DIR, filename)
+
+    @staticmethod
+    def _disk_cache_load(file_hash):
+        """Return the cached parse for ``file_hash`` from disk, or None on a miss.
+
+        The parse is a dict holding ``questions`` (a QuestionStore),
+        ``specialty_index`` and the per-block ``fingerprints`` used for
+        incremental reparsing.
+        """
+        if not PWAQuizLoader._DISK_CACHE_ENABLED or not file_hash:
+            return None
+        if not _private_dir(PWAQuizLoader._DISK_CACHE_DIR):
+            return None
+        path = PWAQuizLoader._disk_cache_path(file_hash)
+        try:
+            with open(path, 'rb') as cache_file:
+                entry = marshal.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable disk cache entry {path}: {e}")
+            PWAQuizLoader._disk_cache_remove(path)
+            return None
+
+        if (
+            not isinstance(entry, dict)
+            or entry.get("version") != PWAQuizLoader._DISK_CACHE_VERSION
+            or entry.get("hash") != file_hash
+        ):
+            PWAQuizLoader._disk_cache_remove(path)
+            return None
+
+        try:
+            # Touch the entry so eviction drops the least recently used files first
+            os.utime(path)
+        except OSError:
+            pass
+        parsed = entry["parsed"]
+        return {**parsed, "questions": QuestionStore.from_columns(parsed["questions"])}
+
+    @staticmethod
+    def _disk_cache_store(file_hash, parsed):
+        """Write a parse result to the disk cache and evict down to the size budget."""
+        if not PWAQuizLoader._DISK_CACHE_ENABLED or not file_hash:
+            return
+        if not _private_dir(PWAQuizLoader._DISK_CACHE_DIR):
+            return
+        path = PWAQuizLoader._disk_cache_path(file_hash)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=PWAQuizLoader._DISK_CACHE_DIR, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as cache_file:
+                    # marshal only handles builtins, so the store is written as its columns
+                    marshal.dump({
+                        "version": PWAQuizLoader._DISK_CACHE_VERSION,
+                        "hash": file_hash,
+                        "parsed": {**parsed, "questions": parsed["questions"].to_columns()},
+                    }, cache_file)
+                # Atomic rename so concurrent workers never read a partial entry
+                os.replace(tmp_path, path)
+            except BaseException:
+                PWAQuizLoader._disk_cache_remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning(f"Could not write disk cache entry {path}: {e}")
+            return
+        PWAQuizLoader._disk_cache_evict()
+
+    @staticmethod
+    def _disk_cache_evict():
+        """Delete stale-version and least recently used entries over the size budget."""
+        suffix = f".v{PWAQuizLoader._DISK_CACHE_VERSION}.marshal"
+        entries = []
+        total = 0
+        try:
+            with os.scandir(PWAQuizLoader._DISK_CACHE_DIR) as it:
+                for entry in it:
+                    # .pkl entries are from before the cache stopped using pickle
+                    if not entry.name.endswith(('.marshal', '.pkl')) or not entry.is_file():
+                        continue
+                    if not entry.name.endswith(suffix):
+                        PWAQuizLoader._disk_cache_remove(entry.path)
+                        continue
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        except OSError as e:
+            logger.warning(f"Could not scan disk cache {PWAQuizLoader._DISK_CACHE_DIR}: {e}")
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= PWAQuizLoader._DISK_CACHE_MAX_BYTES:
+                break
+            PWAQuizLoader._disk_cache_remove(path)
+            total -= size
+
+    @staticmethod
+    def _disk_cache_remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def load_from_markdown(path: str):
+        """Load questions from markdown file - adapted from your main.py."""
+        return PWAQuizLoader.load_with_hash(path)[0]
+
+    @staticmethod
+    def load_with_hash(path: str):
+        """Load questions from a markdown file along with its content hash.
+
+        Returns ``(questions, file_hash)``; ``file_hash`` is None when the file
+        could not be read. The hash identifies the parsed content, so callers
+        can key derived data (serialized responses, ETags) on it.
+        """
+        questions, file_hash, _ = PWAQuizLoader.load_with_index(path)
+        return questions, file_hash
+
+    @staticmethod
+    def load_with_index(path: str):
+        """Load questions, content hash and specialty index for a markdown file.
+
+        Returns ``(questions, file_hash, specialty_index)``, where
+        ``questions`` is the cached QuestionStore; see
+        ``build_specialty_index`` for the index layout.
+        """
+        try:
+            parsed, file_hash, content, stat_signature = PWAQuizLoader._load_cached(path)
+            if parsed is not None:
+                return parsed["questions"], file_hash, parsed["specialty_index"]
+            if file_hash is None:
+                return QuestionStore(), None, PWAQuizLoader.build_specialty_index([])
+
+            # Investigation section stats are a diagnostic only; skip the scan unless tracing
+            if parser_trace.enabled:
+                PWAQuizLoader.analyze_investigation_variations(content)
+
+            started = time.perf_counter()
+            questions, fingerprints = PWAQuizLoader.parse_blocks(
+                content, PWAQuizLoader._previous_parse(path)
+            )
+            metrics.record_parse(len(questions), time.perf_counter() - started)
+            logger.info(f"Loaded {len(questions)} questions from {path}")
+            parsed = PWAQuizLoader._store_parsed(path, file_hash, stat_signature, questions, fingerprints)
+            return parsed["questions"], file_hash, parsed["specialty_index"]
+
+        except Exception as e:
+            logger.error(f"Error loading questions from {path}: {e}")
+            return QuestionStore(), None, PWAQuizLoader.build_specialty_index([])
+
+    @staticmethod
+    def stream_from_markdown(path: str):
+        """Yield questions from a markdown file as they are parsed.
+
+        Cached quizzes are replayed from the cache. Otherwise each question is
+        yielded as soon as QUESTION_RE reaches it (reusing unchanged blocks of
+        an earlier parse), and the caches are filled once the whole file has
+        been walked.
+        """
+        parsed, file_hash, content, stat_signature = PWAQuizLoader._load_cached(path)
+        if parsed is not None:
+            yield from parsed["questions"]
+            return
+        if file_hash is None:
+            return
+
+        reusable = PWAQuizLoader._reusable_blocks(PWAQuizLoader._previous_parse(path))
+        questions = []
+        fingerprints = []
+        reused = 0
+        # Parse time excludes the time spent writing each question to the client
+        parse_seconds = 0.0
+        started = time.perf_counter()
+        for block, specialty in PWAQuizLoader._iter_question_blocks(content):
+            fingerprint = PWAQuizLoader._block_fingerprint(block, specialty)
+            if fingerprint in reusable:
+                q = reusable[fingerprint]
+                reused += 1
+            else:
+                q = PWAQuizLoader._parse_question(block, specialty)
+            fingerprints.append((fingerprint, len(questions) if q else None))
+            if q:
+                questions.append(q)
+                parse_seconds += time.perf_counter() - started
+                yield q
+                started = time.perf_counter()
+        parse_seconds += time.perf_counter() - started
+        metrics.record_parse(len(questions), parse_seconds)
+        PWAQuizLoader._record_block_stats(reused, len(fingerprints) - reused)
+        logger.info(f"Streamed {len(questions)} questions from {path}")
+        PWAQuizLoader._store_parsed(path, file_hash, stat_signature, questions, fingerprints)
+
+    @staticmethod
+    def parse_questions(content):
+        """Parse every question in ``content``; large banks are parsed in parallel chunks."""
+        return PWAQuizLoader.parse_blocks(content)[0]
+
+    @staticmethod
+    def parse_blocks(content, previous=None):
+        """Parse ``content``, reusing blocks unchanged since ``previous``.
+
+        ``previous`` is an earlier parse of the same quiz (its ``questions``
+        and ``fingerprints``). Only blocks whose fingerprint is new go through
+        ``_parse_question``. Returns ``(questions, fingerprints)``, where
+        ``fingerprints`` pairs every block's fingerprint with its index in
+        ``questions`` (None for blocks that did not parse).
+        """
+        reusable = PWAQuizLoader._reusable_blocks(previous)
+        blocks = list(PWAQuizLoader._iter_question_blocks(content))
+        block_fingerprints = [PWAQuizLoader._block_fingerprint(block, specialty) for block, specialty in blocks]
+
+        results = [None] * len(blocks)
+        changed = []
+        for i, fingerprint in enumerate(block_fingerprints):
+            if fingerprint in reusable:
+                results[i] = reusable[fingerprint]
+            else:
+                changed.append(i)
+        if changed:
+            changed_blocks = [blocks[i] for i in changed]
+            parsed = _parse_question_blocks(changed_blocks, sum(len(block) for block, _ in changed_blocks))
+            for i, q in zip(changed, parsed):
+                results[i] = q
+        PWAQuizLoader._record_block_stats(len(blocks) - len(changed), len(changed))
+
+        questions = []
+        fingerprints = []
+        for fingerprint, q in zip(block_fingerprints, results):
+            fingerprints.append((fingerprint, len(questions) if q else None))
+            if q:
+                questions.append(q)
+        return questions, fingerprints
+
+    @staticmethod
+    def _block_fingerprint(block, specialty):
+        """Identity of a question block and the specialty it falls under."""
+        return hashlib.blake2b(f"{specialty}\0{block}".encode(), digest_size=16).digest()
+
+    @staticmethod
+    def _reusable_blocks(previous):
+        """Map block fingerprints of an earlier parse to their results."""
+        if not previous or not previous.get("fingerprints"):
+            return {}
+        questions = previous["questions"]
+        return {
+            fingerprint: (questions[index] if index is not None else None)
+            for fingerprint, index in previous["fingerprints"]
+        }
+
+    @staticmethod
+    def _previous_parse(path):
+        """The in-process parse last cached for ``path``, whatever its content hash."""
+        with PWAQuizLoader._cache_lock:
+            cached = PWAQuizLoader._cache.get(path)
+            if not cached:
+                return None
+            return {"questions": cached["questions"], "fingerprints": cached.get("fingerprints")}
+
+    @staticmethod
+    def _record_block_stats(reused, reparsed):
+        with PWAQuizLoader._cache_lock:
+            PWAQuizLoader._cache_stats["blocks_reused"] += reused
+            PWAQuizLoader._cache_stats["blocks_reparsed"] += reparsed
+        if reused:
+            logger.info(f"Incremental parse: reused {reused} blocks, reparsed {reparsed}")
+
+    @staticmethod
+    def normalize_specialty(specialty):
+        """Key used to index and look up specialties (case-insensitive)."""
+        return specialty.strip().lower()
+
+    @staticmethod
+    def build_specialty_index(questions):
+        """Map normalized specialty to the positions of its questions.
+
+        ``keys`` is sorted so prefix lookups can bisect; ``labels`` keeps the
+        specialty as first written in the quiz for display.
+        """
+        positions: Dict[str, List[int]] = {}
+        labels: Dict[str, str] = {}
+        for i, q in enumerate(questions):
+            key = PWAQuizLoader.normalize_specialty(q['specialty'])
+            positions.setdefault(key, []).append(i)
+            labels.setdefault(key, q['specialty'])
+        return {'keys': sorted(positions), 'positions': positions, 'labels': labels}
+
+    @staticmethod
+    def split_specialty_terms(specialty_index, value):
+        """Split a comma-separated specialty list, unless ``value`` names one specialty.
+
+        Specialty names may contain commas ("Ear, Nose and Throat"), so a
+        value that is exactly an indexed specialty is kept as one term.
+        """
+        if PWAQuizLoader.normalize_specialty(value) in specialty_index['positions']:
+            return [value]
+        return [t for t in value.split(',') if t.strip()]
+
+    @staticmethod
+    def match_specialties(specialty_index, term, mode='substring'):
+        """Return index keys matching ``term``.
+
+        ``exact`` is a dict lookup and ``prefix`` bisects the sorted keys;
+        ``substring`` (the historical behaviour) checks each distinct specialty
+        rather than each question.
+        """
+        term = PWAQuizLoader.normalize_specialty(term)
+        keys = specialty_index['keys']
+        if mode == 'exact':
+            return [term] if term in specialty_index['positions'] else []
+        if mode == 'prefix':
+            matched = []
+            for i in range(bisect.bisect_left(keys, term), len(keys)):
+                if not keys[i].startswith(term):
+                    break
+                matched.append(keys[i])
+            return matched
+        return [key for key in keys if term in key]
+
+    @staticmethod
+    def _load_cached(path):
+        """Resolve ``path`` against the memory and disk caches.
+
+        Returns ``(parsed, file_hash, content, stat_signature)`` where ``parsed``
+        holds ``questions`` and ``specialty_index``. On a miss ``parsed`` is
+        None and ``content`` holds the file text to parse; ``file_hash`` is
+        None when the file could not be read.
+        """
+        with metrics.stage('cache_lookup'):
+            stat_signature = PWAQuizLoader._stat_signature(path)
+            if stat_signature is not None:
+                with PWAQuizLoader._cache_lock:
+                    cached = PWAQuizLoader._cache.get(path)
+                    if cached and cached.get("stat") == stat_signature:
+                        PWAQuizLoader._cache.move_to_end(path)
+                        PWAQuizLoader._cache_stats["stat_hits"] += 1
+                        PWAQuizLoader._cache_stats["hits"] += 1
+                        logger.debug("Returning cached quiz for %s (stat unchanged)", path)
+                        metrics.cache_event('quiz', True)
+                        return PWAQuizLoader._parsed_from_entry(cached), cached["hash"], None, stat_signature
+
+        file_hash, content = PWAQuizLoader._get_file_hash_and_content(path)
+        if not content:
+            return None, None, None, None
+
+        # Only trust the stat signature once the mtime is old enough that a
+        # same-size rewrite within the timestamp granularity can't go unseen
+        if stat_signature is not None and time.time_ns() - stat_signature[0] < PWAQuizLoader._STAT_RACY_WINDOW_NS:
+            stat_signature = None
+
+        with metrics.stage('cache_lookup'):
+            with PWAQuizLoader._cache_lock:
+                PWAQuizLoader._cache_stats["content_reads"] += 1
+                cached = PWAQuizLoader._cache.get(path)
                 if cached and cached["hash"] == file_hash:
-                    cached["last_access"] = time.time()
+                    PWAQuizLoader._cache.move_to_end(path)
+                    cached["stat"] = stat_signature
+                    PWAQuizLoader._cache_stats["hits"] += 1
                     logger.debug("Returning cached quiz for %s", path)
-                    return cached["questions"]
+                    metrics.cache_event('quiz', True)
+                    return PWAQuizLoader._parsed_from_entry(cached), file_hash, content, stat_signature
+                PWAQuizLoader._cache_stats["misses"] += 1
+            metrics.cache_event('quiz', False)
+
+            parsed = PWAQuizLoader._disk_cache_load(file_hash)
+            metrics.cache_event('quiz_disk', parsed is not None)
+            if parsed is not None:
+                logger.debug("Loaded %s from disk cache", path)
+                PWAQuizLoader._remember(path, file_hash, stat_signature, parsed)
+        return parsed, file_hash, content, stat_signature
+
+    @staticmethod
+    def _store_parsed(path, file_hash, stat_signature, questions, fingerprints=None):
+        """Index freshly parsed questions and record them in the disk and in-process caches."""
+        parsed = {
+            "questions": QuestionStore(questions),
+            "specialty_index": PWAQuizLoader.build_specialty_index(questions),
+            "fingerprints": fingerprints,
+        }
+        PWAQuizLoader._disk_cache_store(file_hash, parsed)
+        PWAQuizLoader._remember(path, file_hash, stat_signature, parsed)
+        return parsed
+
+    @staticmethod
+    def _parsed_from_entry(entry):
+        return {"questions": entry["questions"], "specialty_index": entry["specialty_index"]}
+
+    @staticmethod
+    def _estimate_parsed_bytes(parsed):
+        """Approximate memory retained by a cached parse (store, index, fingerprints)."""
+        size = parsed["questions"].estimated_bytes()
+        specialty_index = parsed["specialty_index"]
+        size += sys.getsizeof(specialty_index['keys'])
+        for key, positions in specialty_index['positions'].items():
+            size += sys.getsizeof(key) + sys.getsizeof(positions) + 28 * len(positions)
+        fingerprints = parsed.get("fingerprints")
+        if fingerprints:
+            # (16-byte digest, index) pairs, costed from the first one
+            fingerprint, position = fingerprints[0]
+            size += sys.getsizeof(fingerprints) + len(fingerprints) * (
+                sys.getsizeof(fingerprints[0]) + sys.getsizeof(fingerprint) + sys.getsizeof(position)
+            )
+        return size
+
+    @staticmethod
+    def _remember(path, file_hash, stat_signature, parsed):
+        size = PWAQuizLoader._estimate_parsed_bytes(parsed)
+        with PWAQuizLoader._cache_lock:
+            cache = PWAQuizLoader._cache
+            previous = cache.pop(path, None)
+            if previous is not None:
+                PWAQuizLoader._cache_bytes -= previous["bytes"]
+            cache[path] = {
+                "hash": file_hash,
+                "stat": stat_signature,
+                "questions": parsed["questions"],
+                "specialty_index": parsed["specialty_index"],
+                "fingerprints": parsed.get("fingerprints"),
+                "bytes": size,
+            }
+            PWAQuizLoader._cache_bytes += size
+            # Evict least recently used entries; the one just stored always stays
+            while PWAQuizLoader._cache_bytes > PWAQuizLoader._CACHE_MAX_BYTES and len(cache) > 1:
+                evicted_path, evicted = cache.popitem(last=False)
+                PWAQuizLoader._cache_bytes -= evicted["bytes"]
+                PWAQuizLoader._cache_stats["evictions"] += 1
+                logger.debug("Evicted %s from the quiz cache (%s bytes)", evicted_path, evicted["bytes"])
+
+    @staticmethod
+    def get_available_quizzes():
+        """Get list of available quiz files."""
+        return quiz_registry.list_quizzes()
+
+
+class QuizRegistry:
+    """Index of quiz files by name and filename across the search paths.
+
+    Route lookups are dict hits. A search directory is only re-listed when
+    its mtime changes, i.e. when a file is added, removed or renamed there.
+    """
+
+    # Directory state for a search path that does not exist; it stays
+    # unchanged, and unscanned, for as long as the path is missing
+    _MISSING = 'missing'
+
+    def __init__(self, search_paths):
+        self._search_paths = list(search_paths)
+        self._lock = threading.RLock()
+        self._dir_state: Dict[str, Any] = {}
+        self._quizzes: List[Dict[str, Any]] = []
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._by_filename: Dict[str, Dict[str, Any]] = {}
+        self._hashes: Dict[str, Any] = {}
+
+    @staticmethod
+    def _is_quiz_file(filename):
+        lowered = filename.lower()
+        return filename.endswith('.md') and ('quiz' in lowered or 'ukmla' in lowered or 'mla' in lowered)
+
+    def _scan_directory(self, search_path):
+        records = []
+        for file in os.listdir(search_path):
+            if self._is_quiz_file(file):
+                records.append({
+                    'name': file.replace('.md', ''),
+                    'filename': file,
+                    'path': os.path.join(search_path, file),
+                })
+        return records
+
+    def refresh(self):
+        """Re-list any search directory whose mtime changed since the last scan."""
+        with self._lock:
+            changed = False
+            rescanned = False
+            for search_path in self._search_paths:
+                try:
+                    mtime_ns = os.stat(search_path).st_mtime_ns
+                except OSError:
+                    mtime_ns = self._MISSING
+
+                state = self._dir_state.get(search_path)
+                if state is not None and state[0] is not None and state[0] == mtime_ns:
+                    continue
+                rescanned = True
+
+                records = self._scan_directory(search_path) if mtime_ns != self._MISSING else []
+                # A directory modified within the racy window may still change in
+                # the same mtime tick, so it is re-listed on the next lookup
+                if mtime_ns != self._MISSING and time.time_ns() - mtime_ns < PWAQuizLoader._STAT_RACY_WINDOW_NS:
+                    mtime_ns = None
+                if state is None or state[1] != records:
+                    changed = True
+                self._dir_state[search_path] = (mtime_ns, records)
+            metrics.cache_event('quiz_registry', not rescanned)
+
+            if changed:
+                quizzes = []
+                by_name = {}
+                by_filename = {}
+                for search_path in self._search_paths:
+                    for record in self._dir_state[search_path][1]:
+                        quizzes.append(record)
+                        by_name.setdefault(record['name'], record)
+                        by_filename.setdefault(record['filename'], record)
+                self._quizzes = quizzes
+                self._by_name = by_name
+                self._by_filename = by_filename
+                logger.debug("Quiz registry refreshed: %s quizzes", len(quizzes))
+
+    def find(self, quiz_name, allow_filename=False):
+        """Return the record for ``quiz_name``, optionally also matching ``<name>.md``."""
+        self.refresh()
+        with self._lock:
+            record = self._by_name.get(quiz_name)
+            if record is None and allow_filename:
+                record = self._by_filename.get(f"{quiz_name}.md")
+        return record
+
+    def find_path(self, quiz_name, allow_filename=False):
+        record = self.find(quiz_name, allow_filename)
+        return record['path'] if record else None
+
+    def list_quizzes(self):
+        """Quiz records in search-path order, with current file sizes."""
+        self.refresh()
+        with self._lock:
+            records = list(self._quizzes)
+        quiz_files = []
+        for record in records:
+            try:
+                size = os.path.getsize(record['path'])
+            except OSError:
+                continue
+            quiz_files.append({**record, 'size': size})
+        return quiz_files
+
+    def metadata(self, quiz_name):
+        """Describe a quiz without parsing it.
+
+        ``hash`` comes from the parse cache or a (memoized) read of the file;
+        ``question_count`` and ``specialties`` are filled in only when a parse
+        is already cached in memory or on disk.
+        """
+        record = self.find(quiz_name, allow_filename=True)
+        if record is None:
+            return None
+        path = record['path']
+        stat_signature = PWAQuizLoader._stat_signature(path)
+        if stat_signature is None:
+            return None
+
+        parsed = None
+        file_hash = None
+        with PWAQuizLoader._cache_lock:
+            entry = PWAQuizLoader._cache.get(path)
+            if entry and entry.get("stat") == stat_signature:
+                file_hash = entry["hash"]
+                parsed = PWAQuizLoader._parsed_from_entry(entry)
+
+        if file_hash is None:
+            with self._lock:
+                memo = self._hashes.get(path)
+            if memo and memo[0] == stat_signature:
+                file_hash = memo[1]
+            else:
+                file_hash, _ = PWAQuizLoader._get_file_hash_and_content(path)
+                with self._lock:
+                    self._hashes[path] = (stat_signature, file_hash)
+
+            with PWAQuizLoader._cache_lock:
+                entry = PWAQuizLoader._cache.get(path)
+                if entry and entry["hash"] == file_hash:
+                    parsed = PWAQuizLoader._parsed_from_entry(entry)
+            if parsed is None and file_hash:
+                parsed = PWAQuizLoader._disk_cache_load(file_hash)
+
+        meta = {
+            'name': record['name'],
+            'filename': record['filename'],
+            'size': stat_signature[1],
+            'hash': file_hash,
+            'parsed': parsed is not None,
+            'question_count': None,
+            'specialties': None,
+        }
+        if parsed is not None:
+            index = parsed["specialty_index"]
+            meta['question_count'] = len(parsed["questions"])
+            meta['specialties'] = [
+                {'name': index['labels'][key], 'count': len(index['positions'][key])}
+                for key in index['keys']
+            ]
+        return meta
+
+
+def _default_quiz_search_paths():
+    # Get the directory of the current script
+    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    
+    # Check for quiz files in common locations
+    return [
+        os.path.join(script_dir, 'Questions'),
+        script_dir,
+        os.path.join(script_dir, 'MLA')
+    ]
+
+
+quiz_registry = QuizRegistry(_default_quiz_search_paths())
+
+
+class QuizPrewarmer:
+    """Parse every discovered quiz on a background thread pool.
+
+    Loading goes through ``PWAQuizLoader.load_with_index``, so warmed quizzes
+    land in the in-process cache and the disk cache. ``status()`` feeds the
+    health and readiness endpoints.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._states: Dict[str, str] = {}
+        self._started = False
+        self._finished = False
+        self._executor = None
+
+    def start(self, max_workers=2):
+        """Begin warming all quizzes; later calls are no-ops."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            quizzes = PWAQuizLoader.get_available_quizzes()
+            for quiz in quizzes:
+                self._states[quiz['path']] = 'pending'
+            if not quizzes:
+                self._finished = True
+                return
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quiz-prewarm')
+
+        started_at = time.time()
+        futures = [self._executor.submit(self._warm, quiz['path']) for quiz in quizzes]
+
+        def finish():
+            for future in futures:
+                future.exception()
+            with self._lock:
+                self._finished = True
+            self._executor.shutdown(wait=False)
+            logger.info(f"Pre-warmed {len(futures)} quizzes in {time.time() - started_at:.2f}s")
+
+        threading.Thread(target=finish, name='quiz-prewarm-monitor', daemon=True).start()
+
+    def _warm(self, path):
+        with self._lock:
+            self._states[path] = 'warming'
+        questions, file_hash, _ = PWAQuizLoader.load_with_index(path)
+        if file_hash is not None:
+            state = 'warm'
+        else:
+            # An empty bank has nothing to cache but serves fine; only an
+            # unreadable file counts as a failure
+            stat_signature = PWAQuizLoader._stat_signature(path)
+            state = 'empty' if stat_signature is not None and stat_signature[1] == 0 else 'failed'
+        with self._lock:
+            self._states[path] = state
+        logger.debug("Pre-warmed %s (%s questions)", path, len(questions))
+
+    def status(self):
+        """Per-quiz warm/cold state plus whether the instance is ready for traffic.
+
+        Without a pre-warm the instance is always ready; with one it becomes
+        ready once the warm-up attempt has finished. Quizzes that failed to
+        warm are reported but do not hold readiness back, since they are
+        retried on their first request.
+        """
+        with PWAQuizLoader._cache_lock:
+            cached_paths = set(PWAQuizLoader._cache)
+        with self._lock:
+            states = dict(self._states)
+            started, finished = self._started, self._finished
+
+        quizzes = []
+        for quiz in PWAQuizLoader.get_available_quizzes():
+            if quiz['path'] in cached_paths:
+                state = 'warm'
+            else:
+                state = states.get(quiz['path'], 'cold')
+                if state == 'warm':
+                    # Evicted from the in-process cache since warming
+                    state = 'cold'
+            quizzes.append({'name': quiz['name'], 'status': state})
+
+        return {
+            'ready': not started or finished,
+            'prewarm': 'disabled' if not started else ('running' if not finished else 'complete'),
+            'warm': sum(1 for q in quizzes if q['status'] in ('warm', 'empty')),
+            'failed': sum(1 for q in quizzes if q['status'] == 'failed'),
+            'total': len(quizzes),
+            'quizzes': quizzes,
+        }
+
+
+quiz_prewarmer = QuizPrewarmer()
+
+# Parser worker pools. Parsing is regex-bound, so process pools are the default
+# way to use more than one core; thread pools and serial parsing are the
+# alternatives. Each purpose gets its own pool so a task never waits on work
+# queued behind it in the same pool.
+_PARSE_WORKERS = int(os.environ.get('MLA_PARSE_WORKERS', os.cpu_count() or 1))
+_parse_executors: Dict[tuple, Any] = {}
+_parse_executors_lock = threading.Lock()
+_in_parse_worker = False
+# Process pools never fork the server directly: request, pre-warm and upload
+# threads may hold logging or cache locks at fork time, which would leave a
+# child deadlocked. Workers come from a forkserver (spawn where unavailable).
+_PARSE_MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+# Upper bound on waiting for a pool's results before parsing serially instead
+_PARSE_POOL_TIMEOUT = float(os.environ.get('MLA_PARSE_POOL_TIMEOUT', 120))
+
+# ZIP uploads parse their markdown files concurrently (MLA_UPLOAD_PARSE_MODE:
+# process, thread or serial). Small uploads and single files stay serial.
+_UPLOAD_PARSE_MODE = os.environ.get('MLA_UPLOAD_PARSE_MODE', 'process').lower()
+_UPLOAD_PARALLEL_MIN_CHARS = int(os.environ.get('MLA_UPLOAD_PARALLEL_MIN_CHARS', 256 * 1024))
+
+# A single large bank is split into chunks of question blocks that are parsed
+# concurrently (MLA_CHUNK_PARSE_MODE) once it reaches MLA_CHUNK_PARSE_MIN_CHARS.
+_CHUNK_PARSE_MODE = os.environ.get('MLA_CHUNK_PARSE_MODE', 'process').lower()
+_CHUNK_PARSE_MIN_CHARS = int(os.environ.get('MLA_CHUNK_PARSE_MIN_CHARS', 2 * 1024 * 1024))
+_CHUNKS_PER_WORKER = 4
+
+
+def _mark_parse_worker():
+    global _in_parse_worker
+    _in_parse_worker = True
+
+
+def _parse_executor(purpose, mode):
+    """Shared executor for ``purpose`` and ``mode``, created on first use.
+
+    Returns None inside a pool worker process, where nested pools are not used.
+    """
+    if _in_parse_worker:
+        return None
+    with _parse_executors_lock:
+        executor = _parse_executors.get((purpose, mode))
+        if executor is None:
+            if mode == 'process':
+                executor = ProcessPoolExecutor(
+                    max_workers=_PARSE_WORKERS, mp_context=_PARSE_MP_CONTEXT, initializer=_mark_parse_worker
+                )
+            else:
+                executor = ThreadPoolExecutor(max_workers=_PARSE_WORKERS, thread_name_prefix=f'{purpose}-parse')
+            _parse_executors[(purpose, mode)] = executor
+        return executor
+
+
+def _run_parallel(purpose, mode, func, jobs, on_result=None):
+    """Run ``func(*job)`` for every job on the pool; results keep job order.
+
+    ``on_result(index, result)`` is called as each result is collected. Returns
+    None when the pool is unavailable, or has not delivered every result
+    within ``_PARSE_POOL_TIMEOUT``, so callers can fall back to serial parsing.
+    """
+    executor = _parse_executor(purpose, mode)
+    if executor is None:
+        return None
+    try:
+        futures = [executor.submit(func, *job) for job in jobs]
+        deadline = time.monotonic() + _PARSE_POOL_TIMEOUT
+        results = []
+        for future in futures:
+            results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            if on_result is not None:
+                on_result(len(results) - 1, results[-1])
+        return results
+    except (BrokenProcessPool, FutureTimeoutError, OSError, RuntimeError) as e:
+        # e.g. no /dev/shm semaphores in some serverless sandboxes, or a stuck worker
+        logger.warning(f"{mode} pool for {purpose} parsing unavailable, falling back to serial: {e!r}")
+        with _parse_executors_lock:
+            if _parse_executors.get((purpose, mode)) is executor:
+                del _parse_executors[(purpose, mode)]
+        executor.shutdown(wait=False, cancel_futures=True)
+        return None
+
+
+def _parse_markdown_job(content, filename):
+    """Parse one markdown file; runs in a worker process or thread."""
+    started = time.perf_counter()
+    questions = PWAQuizLoader.parse_markdown_content(content, filename)
+    return questions, (time.perf_counter() - started) * 1000
+
+
+def _parse_markdown_files(jobs, on_result=None):
+    """Parse ``[(filename, content), ...]`` and return ``(results, mode)``.
+
+    ``results`` holds ``(questions, parse_ms)`` per job in input order, so the
+    merged question list is deterministic whatever the execution mode.
+    ``on_result(index, (questions, parse_ms))`` is called as files finish.
+    """
+    mode = _UPLOAD_PARSE_MODE
+    if (
+        mode in ('process', 'thread')
+        and len(jobs) >= 2
+        and _PARSE_WORKERS >= 2
+        and sum(len(content) for _, content in jobs) >= _UPLOAD_PARALLEL_MIN_CHARS
+    ):
+        results = _run_parallel(
+            'upload', mode, _parse_markdown_job,
+            [(content, filename) for filename, content in jobs], on_result
+        )
+        if results is not None:
+            return results, mode
+
+    results = []
+    for filename, content in jobs:
+        results.append(_parse_markdown_job(content, filename))
+        if on_result is not None:
+            on_result(len(results) - 1, results[-1])
+    return results, 'serial'
+
+
+def _parse_question_chunk(chunk):
+    """Parse a run of ``(block, specialty)`` pairs; runs in a worker process or thread."""
+    return [PWAQuizLoader._parse_question(block, specialty) for block, specialty in chunk]
+
+
+def _parse_question_blocks(blocks, content_chars):
+    """Parse ``(block, specialty)`` pairs, chunk-parallel for large banks.
+
+    Returns one result per block (None where a block failed to parse), in
+    block order, so the output matches a serial walk exactly.
+    """
+    if (
+        _CHUNK_PARSE_MODE in ('process', 'thread')
+        and _PARSE_WORKERS >= 2
+        and len(blocks) >= 2
+        and content_chars >= _CHUNK_PARSE_MIN_CHARS
+    ):
+        chunk_count = min(len(blocks), _PARSE_WORKERS * _CHUNKS_PER_WORKER)
+        chunk_size = -(-len(blocks) // chunk_count)
+        chunks = [(blocks[i:i + chunk_size],) for i in range(0, len(blocks), chunk_size)]
+        chunk_results = _run_parallel('chunk', _CHUNK_PARSE_MODE, _parse_question_chunk, chunks)
+        if chunk_results is not None:
+            return [q for chunk_result in chunk_results for q in chunk_result]
+
+    return _parse_question_chunk(blocks)
+
+
+# Serialized JSON responses, keyed by route and quiz and stored with the version
+# (normally the quiz file hash) they were built from, so an unchanged quiz is
+# never re-serialized and clients can revalidate with If-None-Match. Bodies and
+# their compressed variants are budgeted by bytes, least recently used first.
+# Routes only store responses whose keys come from a bounded set (whole quizzes,
+# projections, known specialties); paged and free-form filtered responses are
+# built per request so clients cannot flood the cache with permutations.
+_response_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_response_cache_lock = threading.RLock()
+_response_cache_bytes = 0
+_RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('MLA_RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+
+def _clear_response_cache():
+    global _response_cache_bytes
+    with _response_cache_lock:
+        _response_cache.clear()
+        _response_cache_bytes = 0
+
+
+def _response_cache_account(key, entry, size):
+    """Charge ``size`` bytes to a cached entry and evict down to the budget."""
+    global _response_cache_bytes
+    with _response_cache_lock:
+        if _response_cache.get(key) is not entry:
+            return
+        entry["bytes"] += size
+        _response_cache_bytes += size
+        while _response_cache_bytes > _RESPONSE_CACHE_MAX_BYTES and _response_cache:
+            _, evicted = _response_cache.popitem(last=False)
+            _response_cache_bytes -= evicted["bytes"]
+
+
+def _cached_json_response(key, version, build_payload, store=True):
+    """Serve a JSON payload from the response cache with a strong ETag.
+
+    ``build_payload`` is only called when no serialized body exists for
+    ``version``. Compressed variants are stored on the same entry, and a
+    request whose If-None-Match matches the ETag gets a 304. With ``store``
+    false the body is built and validated the same way but not cached.
+    """
+    global _response_cache_bytes
+    entry = None
+    if store:
+        with _response_cache_lock:
+            entry = _response_cache.get(key)
+            if entry is not None and entry["version"] == version:
+                _response_cache.move_to_end(key)
+            else:
+                entry = None
+        metrics.cache_event('response', entry is not None)
+
+    if entry is None:
+        with metrics.stage('jsonify'):
+            body = f"{app.json.dumps(build_payload())}\n".encode('utf-8')
+        etag_source = f"{version}:{PWAQuizLoader.PARSER_ENGINE}:v{PWAQuizLoader._DISK_CACHE_VERSION}:{key!r}"
+        entry = {
+            "version": version,
+            "etag": hashlib.md5(etag_source.encode('utf-8')).hexdigest(),
+            "body": body,
+            "encoded": {},
+            "bytes": 0,
+        }
+        if store:
+            with _response_cache_lock:
+                previous = _response_cache.pop(key, None)
+                if previous is not None:
+                    _response_cache_bytes -= previous["bytes"]
+                _response_cache[key] = entry
+            _response_cache_account(key, entry, len(body))
+
+    body = entry["body"]
+    etag = entry["etag"]
+    encoding = _negotiate_encoding() if len(body) >= _COMPRESSION_MIN_BYTES else None
+    if encoding:
+        # A compressed representation needs its own strong validator
+        etag = f"{etag}-{encoding}"
+
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        if encoding:
+            encoded = entry["encoded"].get(encoding)
+            if encoded is None:
+                with metrics.stage('compress'):
+                    encoded = _compress_bytes(body, encoding)
+                entry["encoded"][encoding] = encoded
+                if store:
+                    _response_cache_account(key, entry, len(encoded))
+            body = encoded
+        response = app.response_class(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    # Clients may keep the body but must revalidate before reusing it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.before_request
+def start_request_timer():
+    g._request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Observe the request latency and report its stage timings in Server-Timing.
+
+    Registered ahead of the compression hook so it runs after it and the
+    latency includes compression. For streamed responses it covers the time
+    to the first byte only.
+    """
+    started = g.pop('_request_started', None)
+    if not _METRICS_ENABLED or started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe_request(route, request.method, response.status_code, elapsed)
+    if _SERVER_TIMING_ENABLED:
+        timings = g.pop('_server_timing', {})
+        entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+        entries.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers['Server-Timing'] = ', '.join(entries)
+    return response
+
+# Response compression: negotiated from Accept-Encoding. Cached JSON responses
+# and static JS bundles keep their compressed variants, so repeat requests cost
+# no CPU; other responses are compressed on the fly in an after_request hook.
+_COMPRESSION_ENABLED = os.environ.get('MLA_COMPRESSION', '1') != '0'
+_COMPRESSION_MIN_BYTES = int(os.environ.get('MLA_COMPRESSION_MIN_BYTES', 1024))
+_COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'image/svg+xml',
+}
+_GZIP_LEVEL = 6
+_BROTLI_QUALITY = 5
+_static_compressed_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_static_compressed_lock = threading.RLock()
+_STATIC_COMPRESSED_MAX_ENTRIES = 32
+
+
+def no_compression(view):
+    """Route decorator that opts a view's responses out of compression.
+
+    For streams, where buffering for a compressor would hold back lines the
+    client should get as soon as they are written, and for scrape endpoints
+    whose bodies are small and fetched by machines on the local network.
+    """
+    view._no_compression = True
+    return view
+
+
+def _negotiate_encoding():
+    """Pick the best content coding the client accepts, or None for identity."""
+    if not _COMPRESSION_ENABLED:
+        return None
+    view = app.view_functions.get(request.endpoint)
+    if view is not None and getattr(view, '_no_compression', False):
+        return None
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=_GZIP_LEVEL)
+
+
+def _static_compressed_response(directory, filename, mimetype):
+    """Serve a precompressed static file, or None to fall back to send_from_directory."""
+    encoding = _negotiate_encoding()
+    if not encoding:
+        return None
+    path = safe_join(directory, filename)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path) or st.st_size < _COMPRESSION_MIN_BYTES:
+        return None
+
+    key = (path, encoding)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _static_compressed_lock:
+        entry = _static_compressed_cache.get(key)
+        if entry is not None and entry["signature"] == signature:
+            _static_compressed_cache.move_to_end(key)
+        else:
+            entry = None
+
+    if entry is None:
+        try:
+            with open(path, 'rb') as static_file:
+                data = static_file.read()
+        except OSError:
+            return None
+        entry = {
+            "signature": signature,
+            "etag": f"{st.st_mtime_ns:x}-{st.st_size:x}-{encoding}",
+            "body": _compress_bytes(data, encoding),
+        }
+        with _static_compressed_lock:
+            _static_compressed_cache[key] = entry
+            _static_compressed_cache.move_to_end(key)
+            while len(_static_compressed_cache) > _STATIC_COMPRESSED_MAX_ENTRIES:
+                _static_compressed_cache.popitem(last=False)
+
+    if request.if_none_match.contains_weak(entry["etag"]):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(entry["body"], mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(entry["etag"])
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compress eligible responses that were not served from a compressed cache."""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in _COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < _COMPRESSION_MIN_BYTES:
+        return response
+    encoding = _negotiate_encoding()
+    if not encoding:
+        return response
+
+    with metrics.stage('compress'):
+        response.set_data(_compress_bytes(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+# Question list paging and projection (?offset=&limit=&fields=&summary=1) for
+# the quiz and specialty endpoints. Without query args the payload is unchanged.
+_QUESTION_FIELDS = (
+    'id', 'title', 'specialty', 'scenario', 'investigations',
+    'image', 'prompt', 'options', 'correct_answer', 'explanations',
+)
+_SUMMARY_FIELDS = ('id', 'title', 'specialty')
+
+
+def _question_query_from_request():
+    """Parse paging/projection args; raises ValueError with a client-facing message."""
+    def non_negative_int(name):
+        raw = request.args.get(name, '').strip()
+        if not raw:
+            return None
+        try:
+            value = int(raw)
+        except ValueError:
+            raise ValueError(f'{name} must be a non-negative integer')
+        if value < 0:
+            raise ValueError(f'{name} must be a non-negative integer')
+        return value
+
+    offset = non_negative_int('offset') or 0
+    limit = non_negative_int('limit')
+    if limit == 0:
+        # An empty page would hand back next_offset == offset forever
+        raise ValueError('limit must be a positive integer')
+
+    fields = None
+    if request.args.get('summary', '').lower() in ('1', 'true', 'yes'):
+        fields = _SUMMARY_FIELDS
+    elif request.args.get('fields'):
+        requested = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+        unknown = [f for f in requested if f not in _QUESTION_FIELDS]
+        if unknown:
+            raise ValueError(
+                f'Unknown fields: {", ".join(unknown)}. Allowed: {", ".join(_QUESTION_FIELDS)}'
+            )
+        # Always keep the id so clients can fetch the full question later
+        fields = tuple(f for f in _QUESTION_FIELDS if f == 'id' or f in requested)
+
+    return {'offset': offset, 'limit': limit, 'fields': fields}
+
+
+def _apply_question_query(questions, query, positions=None):
+    """Page and project a QuestionStore; returns ``(page, paging_metadata)``.
+
+    ``positions`` restricts the page to those questions, in that order. Only
+    the questions on the page are materialized.
+    """
+    if positions is None:
+        positions = range(len(questions))
+    total = len(positions)
+    offset = min(query['offset'], total)
+    end = total if query['limit'] is None else min(total, offset + query['limit'])
+    page = questions.rows(positions[offset:end], query['fields'])
+
+    meta = {}
+    if query['offset'] or query['limit'] is not None:
+        meta = {
+            'offset': offset,
+            'limit': query['limit'],
+            'next_offset': end if offset < end < total else None,
+        }
+    return page, meta
+
+
+def _question_query_key(query):
+    return (query['offset'], query['limit'], query['fields'])
+
+# Flask Routes
+@app.route('/')
+def home():
+    """Serve the main PWA application."""
+    return render_template('index.html')
+
+@app.route('/api/quizzes')
+def get_quizzes():
+    """Get list of available quizzes."""
+    try:
+        quizzes = PWAQuizLoader.get_available_quizzes()
+        version = hashlib.md5(repr(quizzes).encode('utf-8')).hexdigest()
+        return _cached_json_response(('quizzes',), version, lambda: {
+            'success': True,
+            'quizzes': quizzes
+        })
+    except Exception as e:
+        logger.error(f"Error getting quizzes: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/health')
+def health():
+    """Report per-quiz warm/cold status; always 200 while the process is up."""
+    return jsonify({
+        'success': True,
+        **quiz_prewarmer.status()
+    })
+
+@app.route('/api/ready')
+def ready():
+    """Readiness probe: 503 until the startup pre-warm has finished."""
+    status = quiz_prewarmer.status()
+    return jsonify({
+        'success': status['ready'],
+        **status
+    }), 200 if status['ready'] else 503
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """Report quiz cache counters."""
+    return jsonify({
+        'success': True,
+        'stats': PWAQuizLoader.get_cache_stats()
+    })
+
+@app.route('/metrics')
+@no_compression
+def get_metrics():
+    """Prometheus scrape endpoint for the request and hot-path metrics."""
+    if not _METRICS_ENABLED:
+        return jsonify({
+            'success': False,
+            'error': 'Metrics are disabled'
+        }), 404
+    cache_stats = PWAQuizLoader.get_cache_stats()
+    body = metrics.render({
+        'mla_quiz_cache_entries': ('Quizzes held in the in-process parse cache.', cache_stats['entries']),
+        'mla_quiz_cache_bytes': ('Estimated bytes retained by the in-process parse cache.', cache_stats['bytes']),
+        'mla_response_cache_entries': ('Serialized responses held in the response cache.', len(_response_cache)),
+        'mla_response_cache_bytes': ('Bytes of serialized and compressed bodies in the response cache.',
+                                     _response_cache_bytes),
+    })
+    response = app.response_class(body, mimetype='text/plain')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/quiz/<quiz_name>')
+def get_quiz(quiz_name):
+    """Load a specific quiz."""
+    try:
+        # Find the quiz file
+        quiz_file = quiz_registry.find_path(quiz_name, allow_filename=True)
+        
+        if not quiz_file:
+            return jsonify({
+                'success': False,
+                'error': f'Quiz "{quiz_name}" not found'
+            }), 404
+        
+        try:
+            query = _question_query_from_request()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        # Load questions
+        questions, file_hash = PWAQuizLoader.load_with_hash(quiz_file)
+
+        def payload():
+            page, meta = _apply_question_query(questions, query)
+            return {
+                'success': True,
+                'quiz_name': quiz_name,
+                'questions': page,
+                'total_questions': len(questions),
+                **meta
+            }
+
+        if file_hash is None:
+            return jsonify(payload())
+        
+        # Whole-quiz bodies (full, summary or a field projection) are reused;
+        # pages are cheap to build and their offsets are unbounded
+        return _cached_json_response(
+            ('quiz', quiz_name, _question_query_key(query)), file_hash, payload,
+            store=not query['offset'] and query['limit'] is None,
+        )
+        
+    except Exception as e:
+        logger.error(f"Error loading quiz {quiz_name}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/quiz/<quiz_name>/meta')
+def get_quiz_metadata(quiz_name):
+    """Describe a quiz (size, hash, question count, specialties) without parsing it."""
+    try:
+        meta = quiz_registry.metadata(quiz_name)
+        if meta is None:
+            return jsonify({
+                'success': False,
+                'error': f'Quiz "{quiz_name}" not found'
+            }), 404
+        return jsonify({
+            'success': True,
+            'quiz': meta
+        })
+    except Exception as e:
+        logger.error(f"Error reading metadata for {quiz_name}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Quizzes whose parser trace may be captured on demand: comma-separated names or '*'
+_PARSER_TRACE_QUIZZES = {
+    name.strip() for name in os.environ.get('MLA_PARSER_TRACE', '').split(',') if name.strip()
+}
+
+
+@app.route('/api/quiz/<quiz_name>/trace')
+def trace_quiz(quiz_name):
+    """Re-parse an opted-in quiz with tracing on and return the captured trace."""
+    try:
+        quiz = quiz_registry.find(quiz_name, allow_filename=True)
+        if quiz is None or not (
+            '*' in _PARSER_TRACE_QUIZZES or quiz['name'] in _PARSER_TRACE_QUIZZES
+        ):
+            return jsonify({
+                'success': False,
+                'error': f'Parser tracing is not enabled for quiz "{quiz_name}"'
+            }), 404
+
+        _, content = PWAQuizLoader._get_file_hash_and_content(quiz['path'])
+        questions, trace = PWAQuizLoader.trace_parse(content or '')
+        response = jsonify({
+            'success': True,
+            'quiz_name': quiz['name'],
+            'parser_engine': PWAQuizLoader.PARSER_ENGINE,
+            'total_questions': len(questions),
+            'trace': trace
+        })
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    except Exception as e:
+        logger.error(f"Error tracing quiz {quiz_name}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/quiz/<quiz_name>/stream')
+@no_compression
+def stream_quiz(quiz_name):
+    """Stream a quiz as newline-delimited JSON, one question per line."""
+    try:
+        quiz_file = quiz_registry.find_path(quiz_name, allow_filename=True)
+
+        if not quiz_file:
+            return jsonify({
+                'success': False,
+                'error': f'Quiz "{quiz_name}" not found'
+            }), 404
+
+        try:
+            query = _question_query_from_request()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        def generate():
+            offset, limit, fields = query['offset'], query['limit'], query['fields']
+            position = 0
+            sent = 0
+            try:
+                for q in PWAQuizLoader.stream_from_markdown(quiz_file):
+                    if limit is not None and sent >= limit:
+                        break
+                    position += 1
+                    if position <= offset:
+                        continue
+                    if fields is not None:
+                        q = {field: q[field] for field in fields if field in q}
+                    sent += 1
+                    yield f"{app.json.dumps(q)}\n"
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated stream
+                logger.error(f"Error streaming quiz {quiz_name}: {e}")
+
+        return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    except Exception as e:
+        logger.error(f"Error streaming quiz {quiz_name}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/quiz/submit', methods=['POST'])
+def submit_quiz():
+    """Submit quiz answers and get results."""
+    try:
+        data = request.json
+        quiz_name = data.get('quiz_name')
+        answers = data.get('answers', {})
+        
+        # Load the original quiz to check answers
+        quiz_file = quiz_registry.find_path(quiz_name)
+        
+        if not quiz_file:
+            return jsonify({
+                'success': False,
+                'error': 'Quiz not found'
+            }), 404
+        
+        questions = PWAQuizLoader.load_from_markdown(quiz_file)
+        
+        # Calculate score
+        correct_count = 0
+        total_questions = len(questions)
+        results = []
+        
+        for i, question in enumerate(questions.rows(range(total_questions), ('id', 'title', 'correct_answer'))):
+            question_id = str(question['id'])
+            user_answer = answers.get(question_id)
+            correct_answer = question.get('correct_answer')
+            
+            is_correct = user_answer is not None and user_answer == correct_answer
+            if is_correct:
+                correct_count += 1
+            
+            results.append({
+                'question_id': question['id'],
+                'user_answer': user_answer,
+                'correct_answer': correct_answer,
+                'is_correct': is_correct,
+                'question_title': question['title']
+            })
+        
+        score_percentage = (correct_count / total_questions * 100) if total_questions > 0 else 0
+        
+        return jsonify({
+            'success': True,
+            'score': {
+                'correct': correct_count,
+                'total': total_questions,
+                'percentage': round(score_percentage, 1)
+            },
+            'results': results
+        })
+        
+    except Exception as e:
+        logger.error(f"Error submitting quiz: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+_IMAGE_MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'svg': 'image/svg+xml',
+    'bmp': 'image/bmp',
+    'avif': 'image/avif',
+}
+
+
+class ImageStore:
+    """Content-addressed store for uploaded quiz images (SHA-256 -> blob).
+
+    Blobs are named ``<sha256>.<ext>`` and never change once written, so they
+    are served with an immutable long-lived cache policy and identical images
+    from different uploads share a single file. With ``max_bytes`` set, the
+    least recently used blobs (by mtime, refreshed when a blob is stored
+    again or served) are deleted once the store grows past the budget.
+    """
+
+    URL_PREFIX = '/api/images/'
+    MAX_AGE = 365 * 24 * 60 * 60
+    _NAME_RE = re.compile(r'^([0-9a-f]{64})\.([a-z0-9]+)$')
+    _SHARD_RE = re.compile(r'^[0-9a-f]{2}$')
+    # Serving a blob only refreshes its mtime once it is this old
+    _TOUCH_INTERVAL = 24 * 60 * 60
+
+    def __init__(self, root, max_bytes=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Running total of blob bytes; None until the first scan
+        self._bytes = None
+
+    def _blob_path(self, digest, ext):
+        return os.path.join(self.root, digest[:2], f"{digest}.{ext}")
+
+    def put(self, data, ext):
+        """Store ``data`` and return its blob name, or ``None`` if it could not be written."""
+        return self.put_stream(BytesIO(data), ext)
+
+    def put_stream(self, source, ext, chunk_size=64 * 1024):
+        """Copy ``source`` into the store, hashing as it streams.
+
+        The blob is spooled to a temporary file beside the store and renamed
+        to its digest once complete, so it is never held in memory whole.
+        Returns the blob name, or ``None`` if it could not be written.
+        """
+        ext = ext.lower()
+        if ext not in _IMAGE_MIME_TYPES:
+            return None
+        if not _private_dir(self.root):
+            return None
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as blob:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    blob.write(chunk)
+            digest = digest.hexdigest()
+            path = self._blob_path(digest, ext)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                self._touch(path)
+            else:
+                size = os.path.getsize(tmp_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Same content always lands on the same name, so a concurrent
+                # writer racing us here is harmless
+                os.replace(tmp_path, path)
+                self._added(size)
+            tmp_path = None
+        except Exception as e:
+            logger.warning(f"Could not write image blob to {self.root}: {e}")
+            return None
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        return f"{digest}.{ext}"
+
+    def lookup(self, name):
+        """Return ``(path, digest, mimetype)`` for a stored blob name, or ``None``."""
+        match = self._NAME_RE.match(name)
+        if not match:
+            return None
+        digest, ext = match.groups()
+        mimetype = _IMAGE_MIME_TYPES.get(ext)
+        path = self._blob_path(digest, ext)
+        if mimetype is None or not _private_dir(self.root):
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if time.time() - st.st_mtime > self._TOUCH_INTERVAL:
+            self._touch(path)
+        return path, digest, mimetype
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _scan(self):
+        """``[(mtime, size, path)]`` for every blob in the store."""
+        blobs = []
+        try:
+            with os.scandir(self.root) as shards:
+                for shard in shards:
+                    if not shard.is_dir() or not self._SHARD_RE.match(shard.name):
+                        continue
+                    with os.scandir(shard.path) as entries:
+                        for entry in entries:
+                            if entry.is_file() and self._NAME_RE.match(entry.name):
+                                st = entry.stat()
+                                blobs.append((st.st_mtime, st.st_size, entry.path))
+        except OSError as e:
+            logger.warning(f"Could not scan image store {self.root}: {e}")
+        return blobs
+
+    def _added(self, size):
+        """Account for a new blob and evict down to ``max_bytes`` when over it."""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(blob_size for _, blob_size, _ in self._scan())
+            else:
+                self._bytes += size
+            if self._bytes <= self.max_bytes:
+                return
+            # Rescan so blobs written by other workers sharing the directory
+            # are counted, then drop the least recently used to 90% of budget
+            blobs = sorted(self._scan())
+            total = sum(blob_size for _, blob_size, _ in blobs)
+            target = self.max_bytes * 9 // 10
+            evicted = 0
+            for _, blob_size, path in blobs:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= blob_size
+                evicted += 1
+            self._bytes = total
+        if evicted:
+            logger.info(f"Evicted {evicted} images from {self.root} to stay under {self.max_bytes} bytes")
+
+    @classmethod
+    def url_for(cls, name):
+        return f"{cls.URL_PREFIX}{name}"
+
+
+# Image URLs handed to clients must resolve on every instance, so the store is
+# only used when MLA_IMAGE_STORE_DIR points at storage the instances share (or
+# MLA_IMAGE_STORE=1 forces it, e.g. for a single long-lived server). Otherwise,
+# as on serverless hosts whose /tmp is per instance, images stay inline data URLs.
+_IMAGE_STORE_DIR = os.environ.get('MLA_IMAGE_STORE_DIR')
+_IMAGE_STORE_ENABLED = os.environ.get('MLA_IMAGE_STORE', '1' if _IMAGE_STORE_DIR else '0') == '1'
+image_store = ImageStore(
+    _IMAGE_STORE_DIR or os.path.join(tempfile.gettempdir(), 'mla-image-store'),
+    max_bytes=int(os.environ.get('MLA_IMAGE_STORE_MAX_BYTES', 1024 * 1024 * 1024)),
+)
+
+
+class ImageOptimizer:
+    """Re-encode stored upload images into a display variant and a thumbnail.
+
+    Variants are written back into the ``ImageStore`` and recorded in a small
+    JSON manifest keyed by the source blob's digest, so re-uploading an image
+    that was already optimized costs a manifest read.
+    """
+
+    def __init__(self, store, image_format='webp', quality=85,
+                 max_dimension=1600, thumb_dimension=320):
+        self.store = store
+        self.image_format = image_format
+        self.quality = quality
+        self.variants = (('display', max_dimension), ('thumb', thumb_dimension))
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def _manifest_path(self, digest):
+        return os.path.join(self.store.root, 'variants', f"{digest}.{self.image_format}.json")
+
+    def _read_manifest(self, digest):
+        with self._lock:
+            manifest = self._manifests.get(digest)
+        # Variants may have been evicted from the store since they were cached
+        if manifest is not None and all(self.store.lookup(name) for name in manifest.values()):
+            return manifest
+        try:
+            with open(self._manifest_path(digest), 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+        if not all(self.store.lookup(name) for name in manifest.values()):
+            return None
+        with self._lock:
+            self._manifests[digest] = manifest
+        return manifest
+
+    def _write_manifest(self, digest, manifest):
+        path = self._manifest_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as manifest_file:
+                json.dump(manifest, manifest_file)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write image manifest {path}: {e}")
+        with self._lock:
+            self._manifests[digest] = manifest
+
+    def optimize(self, blob_name):
+        """Return ``{'original', 'display', 'thumb'}`` blob names for ``blob_name``.
+
+        Returns ``None`` for images that are not re-encoded (SVG, animated
+        GIF/WebP) or that Pillow cannot read. BMP sources are always
+        converted; for other formats a variant falls back to the original
+        blob whenever re-encoding does not make it smaller.
+        """
+        found = self.store.lookup(blob_name)
+        if found is None:
+            return None
+        path, digest, mimetype = found
+        if mimetype == 'image/svg+xml':
+            return None
+
+        manifest = self._read_manifest(digest)
+        if manifest is not None:
+            return manifest
+
+        try:
+            with PILImage.open(path) as source:
+                if getattr(source, 'is_animated', False):
+                    return None
+                source.load()
+                has_alpha = source.mode in ('RGBA', 'LA') or (
+                    source.mode == 'P' and 'transparency' in source.info
+                )
+                image = source.convert('RGBA' if has_alpha else 'RGB')
+        except Exception as e:
+            logger.warning(f"Could not read image {blob_name} for optimization: {e}")
+            return None
+
+        source_size = os.path.getsize(path)
+        manifest = {'original': blob_name}
+        for variant, dimension in self.variants:
+            resized = image.copy()
+            resized.thumbnail((dimension, dimension), PILImage.LANCZOS)
+            encoded = self._encode(resized)
+            if mimetype != 'image/bmp' and (encoded is None or len(encoded) >= source_size):
+                manifest[variant] = blob_name
+                continue
+            name = self.store.put(encoded, self.image_format) if encoded is not None else None
+            if name is None:
+                return None
+            manifest[variant] = name
+
+        self._write_manifest(digest, manifest)
+        logger.debug(f"Optimized image {blob_name}: {manifest}")
+        return manifest
+
+    def _encode(self, image):
+        output = BytesIO()
+        try:
+            image.save(output, format=self.image_format.upper(), quality=self.quality)
+        except Exception as e:
+            logger.warning(f"Could not encode image as {self.image_format}: {e}")
+            return None
+        return output.getvalue()
+
+
+def _image_optimizer_from_env():
+    """Build the upload image optimizer, or ``None`` when Pillow or the store is unavailable."""
+    if PILImage is None or not _IMAGE_STORE_ENABLED:
+        return None
+    if os.environ.get('MLA_IMAGE_OPTIMIZE', '1') == '0':
+        return None
+    image_format = os.environ.get('MLA_IMAGE_FORMAT', 'webp').lower()
+    PILImage.init()
+    if image_format not in ('webp', 'avif') or image_format.upper() not in PILImage.SAVE:
+        logger.warning(f"Image format {image_format} is not supported by Pillow here; using webp")
+        image_format = 'webp'
+    return ImageOptimizer(
+        image_store,
+        image_format=image_format,
+        quality=int(os.environ.get('MLA_IMAGE_QUALITY', 85)),
+        max_dimension=int(os.environ.get('MLA_IMAGE_MAX_DIMENSION', 1600)),
+        thumb_dimension=int(os.environ.get('MLA_IMAGE_THUMB_DIMENSION', 320))
+    )
+
+
+image_optimizer = _image_optimizer_from_env()
+
+
+@app.route('/api/images/<name>')
+def get_image(name):
+    """Serve a stored upload image; blobs are immutable and support Range requests."""
+    found = image_store.lookup(name)
+    if found is None:
+        return jsonify({
+            'success': False,
+            'error': 'Image not found'
+        }), 404
+    path, digest, mimetype = found
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        conditional=True,
+        etag=digest,
+        max_age=ImageStore.MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _decode_markdown_file(filename, raw_content):
+    """Decode an uploaded markdown file, trying common encodings in turn."""
+    content = None
+    encodings_to_try = ['utf-8', 'utf-8-sig', 'latin1', 'cp1252']
+
+    for encoding in encodings_to_try:
+        try:
+            content = raw_content.decode(encoding)
+            logger.debug(f"Successfully decoded with {encoding}")
+            break
+        except UnicodeDecodeError as e:
+            logger.warning(f"Failed to decode with {encoding}: {e}")
+            continue
+
+    if content is None:
+        logger.error(f"Could not decode {filename} with any encoding")
+        return None
+
+    logger.debug(f"Decoded content length: {len(content)} characters")
+    logger.debug(f"First 500 characters: {repr(content[:500])}")
+
+    has_questions = bool(re.search(r'###\s*\d+', content))
+    has_hash_headers = content.count('###') > 0
+    has_bullet_points = content.count('A)') > 0 or content.count('A.') > 0
+
+    logger.debug(f"Content validation - has_questions: {has_questions}, has_hash_headers: {has_hash_headers}, has_bullet_points: {has_bullet_points}")
+
+    if not has_questions and not has_hash_headers:
+        logger.warning(f"File {filename} does not appear to contain quiz questions (no ### headers found)")
+        sample_lines = content.split('\n')[:20]
+        logger.debug(f"First 20 lines: {sample_lines}")
+
+    return content
+
+
+class ImageAliasIndex:
+    """Resolve image references against the images extracted from an upload.
+
+    Built once per upload from ``image_data`` (or any dict keyed the same
+    way) so each markdown file is rewritten in a single pass instead of
+    re-scanning it for every image key.
+    Lookups try the exact key, then a case-folded key, the basename and the
+    stem, and finally (for ``[IMAGE: ...]`` tags only) a fuzzy containment
+    match in the same key order the upload recorded.
+    """
+
+    def __init__(self, image_data):
+        self.image_data = image_data
+        self._folded = {}
+        for key in image_data:
+            self._folded.setdefault(key.casefold(), key)
+        self._resolved = {}
+
+    def _lookup(self, token):
+        if token in self.image_data:
+            return token
+        key = self._folded.get(token.casefold())
+        if key is not None:
+            return key
+        basename = token.replace('\\', '/').rsplit('/', 1)[-1]
+        for candidate in (basename, basename.rsplit('.', 1)[0]):
+            key = self._folded.get(candidate.casefold())
+            if key is not None:
+                return key
+        return None
+
+    def _fuzzy_lookup(self, token):
+        folded = token.casefold()
+        for key in self.image_data:
+            key_folded = key.casefold()
+            if folded in key_folded or key_folded in folded:
+                return key
+        return None
+
+    def resolve(self, token, fuzzy=False):
+        """Return the ``image_data`` key ``token`` refers to, or ``None``."""
+        cache_key = (token, fuzzy)
+        if cache_key not in self._resolved:
+            key = self._lookup(token)
+            if key is None and fuzzy:
+                key = self._fuzzy_lookup(token)
+            self._resolved[cache_key] = key
+        return self._resolved[cache_key]
+
+
+# One alternation covers every reference form the upload rewrites:
+# ``[IMAGE: name]`` tags, ``(path)`` / ``(./path)`` / ``(../path)`` link
+# targets and quoted paths.  Link and quote bodies exclude brackets and the
+# other delimiters so an unresolved token (e.g. prose between apostrophes)
+# can never swallow a reference that should have matched on its own.
+_IMAGE_REFERENCE_RE = re.compile(
+    r'\[IMAGE:\s*(?P<tag>[^\]]+)\]'
+    r'|\((?:\.\.?/)?(?P<paren>[^()\[\]"\'\n]+)\)'
+    r'|"(?P<dquote>[^"()\[\]\n]+)"'
+    r"|'(?P<squote>[^'()\[\]\n]+)'",
+    re.IGNORECASE
+)
+
+
+def _rewrite_image_references(content, image_data, filename, alias_index=None):
+    """Point image references in ``content`` at the uploaded images."""
+    if not image_data:
+        return content
+    if alias_index is None:
+        alias_index = ImageAliasIndex(image_data)
+
+    replaced = set()
+
+    def substitute(match):
+        kind = match.lastgroup
+        token = match.group(kind).strip()
+        key = alias_index.resolve(token, fuzzy=(kind == 'tag'))
+        if key is None:
+            return match.group(0)
+        replaced.add(key)
+        image_url = image_data[key]
+        if kind == 'tag':
+            return f"![Image]({image_url})"
+        if kind == 'paren':
+            return f"({image_url})"
+        quote = '"' if kind == 'dquote' else "'"
+        return f"{quote}{image_url}{quote}"
+
+    rewritten = _IMAGE_REFERENCE_RE.sub(substitute, content)
+
+    logger.debug(f"Made {len(replaced)} image replacements in {filename}")
+    if not replaced:
+        logger.warning(f"No image replacements made in {filename}, but {len(image_data)} images available")
+        logger.debug(f"Available images: {list(image_data.keys())}")
+        image_refs = re.findall(r'\[IMAGE:\s*([^\]]+)\]', content, re.IGNORECASE)
+        if image_refs:
+            logger.debug(f"Found IMAGE references: {image_refs}")
+        else:
+            logger.debug("No [IMAGE: ...] references found in content")
+        logger.debug(f"Content preview: {content[:300]}...")
+    return rewritten
+
+
+def _image_reference_keys(image_files):
+    """Map every key an uploaded image may be referenced by to its ZIP entry.
+
+    Keys and their order mirror what ``_register_image`` records, so
+    resolving a reference against this map picks the same image the final
+    rewrite will.
+    """
+    keys = {}
+    for image_file in image_files:
+        primary_key = image_file.replace('\\', '/').lstrip('./')
+        keys[primary_key] = image_file
+        for ref_key in _image_alias_keys(image_file):
+            if ref_key != primary_key and ref_key not in keys:
+                keys[ref_key] = image_file
+    return keys
+
+
+def _image_alias_keys(image_file):
+    filename_only = image_file.split('/')[-1]
+    name_without_ext = filename_only.rsplit('.', 1)[0]
+    return [
+        image_file,
+        filename_only,
+        name_without_ext,
+        filename_only.lower(),
+        name_without_ext.lower()
+    ]
+
+
+def _register_image(image_data, image_file, image_url):
+    """Record an extracted image under its primary key plus ``__REF__`` aliases."""
+    primary_key = image_file.replace('\\', '/').lstrip('./')
+    image_data[primary_key] = image_url
+    reference_keys = _image_alias_keys(image_file)
+    for ref_key in reference_keys:
+        if ref_key != primary_key and ref_key not in image_data:
+            image_data[ref_key] = f"__REF__:{primary_key}"
+    logger.debug(f"Processed image: {image_file} -> primary key: {primary_key}, references: {len(reference_keys)}")
+
+
+def _referenced_images(contents, image_keys):
+    """Return the ZIP entries of every image the markdown ``contents`` refer to."""
+    alias_index = ImageAliasIndex(image_keys)
+    referenced = set()
+    for content in contents:
+        for match in _IMAGE_REFERENCE_RE.finditer(content):
+            kind = match.lastgroup
+            key = alias_index.resolve(match.group(kind).strip(), fuzzy=(kind == 'tag'))
+            if key is not None:
+                referenced.add(image_keys[key])
+    return referenced
+
+
+# Upload limits. The default cap matches Vercel's 4.5MB request body limit; raise
+# it for self-hosted deployments. The spooled upload rolls over to disk past
+# _UPLOAD_SPOOL_BYTES. What ingestion may hold in memory (decoded markdown, plus
+# ZIP images when inlined as data URLs) is bounded by _ZIP_MAX_MEMORY_BYTES for
+# plain markdown uploads too. ZIP archives are further bounded by entry count
+# and by the uncompressed size of the images they extract.
+_UPLOAD_MAX_BYTES = int(os.environ.get('MLA_UPLOAD_MAX_BYTES', 4.5 * 1024 * 1024))
+_UPLOAD_SPOOL_BYTES = 4 * 1024 * 1024
+_ZIP_MAX_ENTRIES = int(os.environ.get('MLA_ZIP_MAX_ENTRIES', 2000))
+_ZIP_MAX_MEMORY_BYTES = int(os.environ.get('MLA_ZIP_MAX_MEMORY_BYTES', 32 * 1024 * 1024))
+_ZIP_MAX_UNCOMPRESSED_BYTES = int(os.environ.get('MLA_ZIP_MAX_UNCOMPRESSED_BYTES', 256 * 1024 * 1024))
+
+
+def _process_upload(upload_name, temp_file, progress=None):
+    """Parse a spooled upload; returns ``(payload, status_code)``.
+
+    ``progress`` is an optional dict updated in place (``stage``,
+    ``files_total``, ``files_done``, ``questions``) for async upload jobs.
+    """
+    if progress is None:
+        progress = {}
+
+    if upload_name.lower().endswith('.zip'):
+        logger.info("Processing ZIP file")
+
+        try:
+            temp_file.seek(0)
+            quiz_data = []
+            image_data = {}  # Store images from zip
+            image_variants = {}  # Optimized display/thumbnail URLs per image
+            file_timings = []
+            parse_mode = 'serial'
+
+            with zipfile.ZipFile(temp_file, 'r') as zip_ref:
+                infos = zip_ref.infolist()
+                if len(infos) > _ZIP_MAX_ENTRIES:
+                    return {
+                        'success': False,
+                        'error': f'ZIP contains too many entries ({len(infos)}). Maximum is {_ZIP_MAX_ENTRIES}.'
+                    }, 400
+
+                # Get all files in the zip with their declared uncompressed sizes
+                all_files = [info.filename for info in infos]
+                entry_sizes = {info.filename: info.file_size for info in infos}
+                # Filter out directories and hidden files
+                actual_files = [f for f in all_files if not f.endswith('/') and not f.startswith('__MACOSX') and not f.startswith('.')]
+                md_files = [f for f in actual_files if f.lower().endswith(('.md', '.txt')) and not f.startswith('.')]
+                image_files = [f for f in actual_files if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp'))]
+
+                logger.debug(f"ZIP contents: {all_files}")
+                logger.debug(f"Found {len(md_files)} .md files: {md_files}")
+                logger.debug(f"Found {len(image_files)} image files: {image_files}")
+
+                if not md_files:
+                    return {
+                        'success': False,
+                        'error': f'No markdown files found in ZIP. Found files: {actual_files[:10]}... (showing first 10)'
+                    }, 400
+
+                # Markdown is decoded in memory, so it is charged against the memory budget
+                memory_budget = _ZIP_MAX_MEMORY_BYTES - sum(entry_sizes[f] for f in md_files)
+                if memory_budget < 0:
+                    return {
+                        'success': False,
+                        'error': f'Markdown in ZIP is too large. Maximum is {_ZIP_MAX_MEMORY_BYTES // (1024 * 1024)}MB uncompressed.'
+                    }, 400
+
+                decoded = []
+                for filename in md_files:
+                    try:
+                        logger.debug(f"Processing MD file: {filename}")
+                        started = time.perf_counter()
+                        with zip_ref.open(filename) as md_file:
+                            raw_content = md_file.read()
+                        logger.debug(f"Raw content length: {len(raw_content)} bytes")
+
+                        content = _decode_markdown_file(filename, raw_content)
+                        if content is None:
+                            continue
+                        decoded.append((filename, content, (time.perf_counter() - started) * 1000))
+                    except UnicodeDecodeError as e:
+                        logger.warning(f"Could not decode file {filename}: {e}")
+                        continue
+                    except Exception as e:
+                        logger.error(f"Error processing file {filename}: {e}")
+                        continue
+
+                # Only images the markdown actually references are extracted
+                image_keys = _image_reference_keys(image_files)
+                referenced = _referenced_images([content for _, content, _ in decoded], image_keys)
+                referenced_files = [f for f in image_files if f in referenced]
+                logger.debug(f"{len(referenced_files)} of {len(image_files)} images referenced; skipping the rest")
+
+                if sum(entry_sizes[f] for f in referenced_files) > _ZIP_MAX_UNCOMPRESSED_BYTES:
+                    return {
+                        'success': False,
+                        'error': f'Images in ZIP are too large. Maximum is {_ZIP_MAX_UNCOMPRESSED_BYTES // (1024 * 1024)}MB uncompressed.'
+                    }, 400
+
+                progress.update(stage='images', files_total=len(decoded))
+                images_started = time.perf_counter()
+                for image_file in referenced_files:
+                    try:
+                        ext = image_file.lower().split('.')[-1]
+                        image_url = None
+
+                        # Prefer streaming into the content-addressed store; inline
+                        # a data URL only if the store is off or unwritable
+                        if _IMAGE_STORE_ENABLED:
+                            with zip_ref.open(image_file) as img_file:
+                                blob_name = image_store.put_stream(img_file, ext)
+                            variants = None
+                            if blob_name and image_optimizer is not None:
+                                variants = image_optimizer.optimize(blob_name)
+                            if variants:
+                                primary_key = image_file.replace('\\', '/').lstrip('./')
+                                image_variants[primary_key] = {
+                                    variant: ImageStore.url_for(name) for variant, name in variants.items()
+                                }
+                                blob_name = variants['display']
+                            if blob_name:
+                                image_url = ImageStore.url_for(blob_name)
+
+                        if image_url is None:
+                            # Raw bytes plus their base64 copy are held at once
+                            inline_cost = entry_sizes[image_file] * 7 // 3
+                            if inline_cost > memory_budget:
+                                logger.warning(f"Skipping image {image_file}: over the upload memory budget")
+                                continue
+                            memory_budget -= inline_cost
+                            with zip_ref.open(image_file) as img_file:
+                                img_content = img_file.read()
+                            mime_type = _IMAGE_MIME_TYPES.get(ext, 'image/jpeg')
+                            img_base64 = base64.b64encode(img_content).decode('utf-8')
+                            image_url = f"data:{mime_type};base64,{img_base64}"
+
+                        _register_image(image_data, image_file, image_url)
+                    except Exception as e:
+                        logger.warning(f"Could not process image {image_file}: {e}")
+                        continue
+                metrics.observe_stage('upload_images', time.perf_counter() - images_started)
+
+                alias_index = ImageAliasIndex(image_data)
+                prepared = []
+                for filename, content, prepare_ms in decoded:
+                    started = time.perf_counter()
+                    content = _rewrite_image_references(content, image_data, filename, alias_index)
+                    prepared.append((filename, content, prepare_ms + (time.perf_counter() - started) * 1000))
+
+                progress.update(stage='parsing', files_done=0, questions=0)
+
+                parsed_counts = {}
+
+                def file_parsed(index, result):
+                    # Keyed by index: a pool that fails part-way is retried serially
+                    parsed_counts[index] = len(result[0])
+                    progress.update(files_done=len(parsed_counts), questions=sum(parsed_counts.values()))
+
+                parse_results, parse_mode = _parse_markdown_files(
+                    [(filename, content) for filename, content, _ in prepared],
+                    on_result=file_parsed
+                )
+                for (filename, content, prepare_ms), (questions, parse_ms) in zip(prepared, parse_results):
+                    metrics.record_parse(len(questions), parse_ms / 1000)
+                    quiz_data.extend(questions)
+                    file_timings.append({
+                        'file': filename,
+                        'prepare_ms': round(prepare_ms, 2),
+                        'parse_ms': round(parse_ms, 2),
+                        'questions': len(questions)
+                    })
+                    logger.debug(f"Extracted {len(questions)} questions from {filename}")
+
+                    if len(questions) == 0:
+                        logger.error(f"NO QUESTIONS FOUND in {filename}")
+                        logger.error(f"Content length: {len(content)} characters")
+                        logger.error(f"Content preview (first 500 chars): {content[:500]}")
+                        logger.error(f"Looking for ### patterns...")
+                        question_matches = re.findall(r'###\s*\d+', content)
+                        logger.error(f"Found {len(question_matches)} question headers: {question_matches[:5]}")
+                    else:
+                        logger.debug(f"Successfully found {len(questions)} questions in {filename}")
+            if not quiz_data:
+                error_msg = f'No valid quiz questions found in the uploaded files. Processed {len(md_files)} markdown files: {", ".join([f.split("/")[-1] for f in md_files])}'
+                logger.error(f"Final error: {error_msg}")
+                return {
+                    'success': False,
+                    'error': error_msg
+                }, 400
+
+        except zipfile.BadZipFile:
+            logger.error("Invalid ZIP file")
+            return {
+                'success': False,
+                'error': 'Invalid zip file format'
+            }, 400
+        except Exception as e:
+            logger.error(f"ZIP processing error: {e}")
+            return {
+                'success': False,
+                'error': f'Error processing ZIP file: {str(e)}'
+            }, 500
+
+        quiz_name = _upload_quiz_name(upload_name)
+        logger.info(f"Successfully processed ZIP file: {len(quiz_data)} total questions, {len(image_data)} images")
+
+        return {
+            'success': True,
+            'quiz_name': quiz_name,
+            'questions': quiz_data,
+            'total_questions': len(quiz_data),
+            'images': image_data,
+            'image_variants': image_variants,
+            'parse_mode': parse_mode,
+            'file_timings': file_timings
+        }, 200
+
+    elif upload_name.lower().endswith('.md'):
+        logger.info("Processing MD file")
+        try:
+            # The whole file is decoded in memory, so it must fit the memory budget
+            size = temp_file.seek(0, os.SEEK_END)
+            if size > _ZIP_MAX_MEMORY_BYTES:
+                return {
+                    'success': False,
+                    'error': f'Markdown file is too large. Maximum is {_ZIP_MAX_MEMORY_BYTES // (1024 * 1024)}MB.'
+                }, 400
+            temp_file.seek(0)
+            content = temp_file.read().decode('utf-8')
+            progress.update(stage='parsing', files_total=1, files_done=0, questions=0)
+            started = time.perf_counter()
+            questions = PWAQuizLoader.parse_markdown_content(content, upload_name)
+            metrics.record_parse(len(questions), time.perf_counter() - started)
+            progress.update(files_done=1, questions=len(questions))
+
+            if not questions:
+                return {
+                    'success': False,
+                    'error': 'No valid quiz questions found in the markdown file'
+                }, 400
 
-            # Analyze investigation variations
-            PWAQuizLoader.analyze_investigation_variations(content)
+            logger.info(f"Successfully processed MD file: {len(questions)} questions")
 
-            questions = []
-            specialty_markers = [(0, "Uncategorized")]
-            
-            # Find specialty headers
-            for m in PWAQuizLoader.SPECIALTY_HEADER_RE.finditer(content):
-                specialty_markers.append((m.start(), m.group(1).strip()))
-            specialty_markers.sort(key=lambda x: x[0])
-
-            def find_specialty(pos: int) -> str:
-                lo, hi = 0, len(specialty_markers) - 1
-                best = 0
-                while lo <= hi:
-                    mid = (lo + hi) // 2
-                    if specialty_markers[mid][0] <= pos:
-                        best = mid
-                        lo = mid + 1
-                    else:
-                        hi = mid - 1
-                return specialty_markers[best][1]
+            return {
+                'success': True,
+                'quiz_name': _upload_quiz_name(upload_name),
+                'questions': questions,
+                'total_questions': len(questions)
+            }, 200
+        except UnicodeDecodeError:
+            return {
+                'success': False,
+                'error': 'Could not read the markdown file. Please ensure it is UTF-8 encoded.'
+            }, 400
+        except Exception as e:
+            logger.error(f"MD processing error: {e}")
+            return {
+                'success': False,
+                'error': f'Error processing markdown file: {str(e)}'
+            }, 500
 
-            # Parse questions
-            for qm in PWAQuizLoader.QUESTION_RE.finditer(content):
-                block = qm.group(1)
-                specialty = find_specialty(qm.start())
-                q = PWAQuizLoader._parse_question(block, specialty)
-                if q:
-                    questions.append(q)
+    else:
+        return {
+            'success': False,
+            'error': 'Unsupported file type. Please upload .md or .zip files'
+        }, 400
 
-            logger.info(f"Loaded {len(questions)} questions from {path}")
 
-            with PWAQuizLoader._cache_lock:
-                PWAQuizLoader._cache[path] = {
-                    "hash": file_hash,
-                    "questions": questions,
-                    "last_access": time.time(),
-                }
-                if len(PWAQuizLoader._cache) > PWAQuizLoader._CACHE_MAX_SIZE:
-                    oldest_key = min(
-                        PWAQuizLoader._cache.items(),
-                        key=lambda item: item[1]["last_access"],
-                    )[0]
-                    PWAQuizLoader._cache.pop(oldest_key, None)
+class UploadResultCache:
+    """Bounded LRU of successful upload results keyed by the upload's SHA-256.
 
-            return questions
+    Repeat uploads of the same file return the stored payload instead of
+    reparsing, and clients can fetch a result by hash alone. Entries are
+    budgeted by serialized size; with ``persist_dir`` set they are also
+    written as gzipped JSON so they survive restarts. Results are tied to the
+    parser engine and cache version, and a result whose stored images have
+    since disappeared is treated as a miss.
+    """
 
-        except Exception as e:
-            logger.error(f"Error loading questions from {path}: {e}")
-            return []
+    def __init__(self, max_bytes=32 * 1024 * 1024, persist_dir=None, persist_max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.persist_dir = persist_dir
+        self.persist_max_bytes = persist_max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
 
     @staticmethod
-    def get_available_quizzes():
-        """Get list of available quiz files."""
-        now = time.time()
-        with PWAQuizLoader._quiz_list_lock:
-            cached = PWAQuizLoader._quiz_list_cache
-            if (
-                cached["data"]
-                and now - cached["timestamp"] < PWAQuizLoader._QUIZ_LIST_TTL
-            ):
-                logger.debug("Returning cached quiz list")
-                return list(cached["data"])
+    def _signature():
+        return f"{PWAQuizLoader.PARSER_ENGINE}:v{PWAQuizLoader._DISK_CACHE_VERSION}"
 
-        quiz_files = []
+    @staticmethod
+    def _blob_names(payload):
+        urls = list(payload.get('images', {}).values())
+        for variants in payload.get('image_variants', {}).values():
+            urls.extend(variants.values())
+        return sorted({url[len(ImageStore.URL_PREFIX):] for url in urls
+                       if url.startswith(ImageStore.URL_PREFIX)})
 
-        # Get the directory of the current script
-        script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        
-        # Check for quiz files in common locations
-        search_paths = [
-            os.path.join(script_dir, 'Questions'),
-            script_dir,
-            os.path.join(script_dir, 'MLA')
-        ]
-        
-        for search_path in search_paths:
-            if os.path.exists(search_path):
-                for file in os.listdir(search_path):
-                    if file.endswith('.md') and ('quiz' in file.lower() or 'ukmla' in file.lower() or 'mla' in file.lower()):
-                        quiz_files.append({
-                            'name': file.replace('.md', ''),
-                            'filename': file,
-                            'path': os.path.join(search_path, file),
-                            'size': os.path.getsize(os.path.join(search_path, file))
-                        })
-        
-        with PWAQuizLoader._quiz_list_lock:
-            PWAQuizLoader._quiz_list_cache = {
-                "timestamp": now,
-                "data": list(quiz_files),
-            }
+    def _valid(self, entry, kind):
+        if entry.get('signature') != self._signature():
+            return False
+        if kind is not None and entry.get('kind') != kind:
+            return False
+        return all(image_store.lookup(name) for name in entry.get('blobs', ()))
 
-        return quiz_files
+    def get(self, upload_hash, kind=None):
+        """Return the cached payload for ``upload_hash`` or ``None``.
 
-# Flask Routes
-@app.route('/')
-def home():
-    """Serve the main PWA application."""
-    return render_template('index.html')
+        ``kind`` ('zip' or 'md') must match the stored upload when given.
+        """
+        with self._lock:
+            entry = self._entries.get(upload_hash)
+            if entry is not None:
+                self._entries.move_to_end(upload_hash)
+        if entry is None:
+            entry = self._load(upload_hash)
+            if entry is None:
+                return None
+            self._insert(upload_hash, entry)
+        if not self._valid(entry, kind):
+            return None
+        return entry['payload']
 
-@app.route('/api/quizzes')
-def get_quizzes():
-    """Get list of available quizzes."""
-    try:
-        quizzes = PWAQuizLoader.get_available_quizzes()
-        return jsonify({
-            'success': True,
-            'quizzes': quizzes
-        })
-    except Exception as e:
-        logger.error(f"Error getting quizzes: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    def put(self, upload_hash, kind, payload):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        entry = {
+            'signature': self._signature(),
+            'kind': kind,
+            'blobs': self._blob_names(payload),
+            'payload': payload,
+            'size': len(body),
+        }
+        if entry['size'] <= self.max_bytes:
+            self._insert(upload_hash, entry)
+        self._persist(upload_hash, entry, body)
 
-@app.route('/api/quiz/<quiz_name>')
-def get_quiz(quiz_name):
-    """Load a specific quiz."""
-    try:
-        # Find the quiz file
-        quizzes = PWAQuizLoader.get_available_quizzes()
-        quiz_file = None
-        
-        for quiz in quizzes:
-            if quiz['name'] == quiz_name or quiz['filename'] == f"{quiz_name}.md":
-                quiz_file = quiz['path']
-                break
-        
-        if not quiz_file:
-            return jsonify({
-                'success': False,
-                'error': f'Quiz "{quiz_name}" not found'
-            }), 404
-        
-        # Load questions
-        questions = PWAQuizLoader.load_from_markdown(quiz_file)
-        
-        return jsonify({
-            'success': True,
-            'quiz_name': quiz_name,
-            'questions': questions,
-            'total_questions': len(questions)
-        })
-        
-    except Exception as e:
-        logger.error(f"Error loading quiz {quiz_name}: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    def _insert(self, upload_hash, entry):
+        with self._lock:
+            previous = self._entries.pop(upload_hash, None)
+            if previous is not None:
+                self._bytes -= previous['size']
+            self._entries[upload_hash] = entry
+            self._bytes += entry['size']
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted['size']
 
-@app.route('/api/quiz/submit', methods=['POST'])
-def submit_quiz():
-    """Submit quiz answers and get results."""
-    try:
-        data = request.json
-        quiz_name = data.get('quiz_name')
-        answers = data.get('answers', {})
-        
-        # Load the original quiz to check answers
-        quizzes = PWAQuizLoader.get_available_quizzes()
-        quiz_file = None
-        
-        for quiz in quizzes:
-            if quiz['name'] == quiz_name:
-                quiz_file = quiz['path']
+    def _persist_path(self, upload_hash):
+        return os.path.join(self.persist_dir, f"{upload_hash}.json.gz")
+
+    def _persist(self, upload_hash, entry, body):
+        if not self.persist_dir:
+            return
+        path = self._persist_path(upload_hash)
+        header = {key: entry[key] for key in ('signature', 'kind', 'blobs')}
+        if not _private_dir(self.persist_dir):
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.persist_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as cache_file:
+                    cache_file.write(json.dumps(header).encode('utf-8') + b'\n' + body)
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except Exception as e:
+            logger.warning(f"Could not persist upload result {path}: {e}")
+            return
+        self._evict_persisted()
+
+    def _load(self, upload_hash):
+        if not self.persist_dir or not re.fullmatch(r'[0-9a-f]{64}', upload_hash):
+            return None
+        if not _private_dir(self.persist_dir):
+            return None
+        try:
+            with gzip.open(self._persist_path(upload_hash), 'rb') as cache_file:
+                header, body = cache_file.read().split(b'\n', 1)
+            entry = json.loads(header)
+            entry['payload'] = json.loads(body)
+            entry['size'] = len(body)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable upload result {upload_hash}: {e}")
+            return None
+        return entry
+
+    def _evict_persisted(self):
+        """Delete the least recently written results over the on-disk budget."""
+        try:
+            with os.scandir(self.persist_dir) as it:
+                files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in it if entry.name.endswith('.json.gz')]
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.persist_max_bytes:
                 break
-        
-        if not quiz_file:
-            return jsonify({
-                'success': False,
-                'error': 'Quiz not found'
-            }), 404
-        
-        questions = PWAQuizLoader.load_from_markdown(quiz_file)
-        
-        # Calculate score
-        correct_count = 0
-        total_questions = len(questions)
-        results = []
-        
-        for i, question in enumerate(questions):
-            question_id = str(question['id'])
-            user_answer = answers.get(question_id)
-            correct_answer = question.get('correct_answer')
-            
-            is_correct = user_answer is not None and user_answer == correct_answer
-            if is_correct:
-                correct_count += 1
-            
-            results.append({
-                'question_id': question['id'],
-                'user_answer': user_answer,
-                'correct_answer': correct_answer,
-                'is_correct': is_correct,
-                'question_title': question['title']
-            })
-        
-        score_percentage = (correct_count / total_questions * 100) if total_questions > 0 else 0
-        
-        return jsonify({
-            'success': True,
-            'score': {
-                'correct': correct_count,
-                'total': total_questions,
-                'percentage': round(score_percentage, 1)
-            },
-            'results': results
-        })
-        
-    except Exception as e:
-        logger.error(f"Error submitting quiz: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+upload_result_cache = UploadResultCache(
+    max_bytes=int(os.environ.get('MLA_UPLOAD_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    persist_dir=os.environ.get('MLA_UPLOAD_CACHE_DIR') or None,
+    persist_max_bytes=int(os.environ.get('MLA_UPLOAD_CACHE_DISK_BYTES', 256 * 1024 * 1024))
+)
+
+
+def _upload_kind(upload_name):
+    lowered = upload_name.lower()
+    if lowered.endswith('.zip'):
+        return 'zip'
+    if lowered.endswith('.md'):
+        return 'md'
+    return None
+
+
+def _upload_quiz_name(upload_name):
+    if _upload_kind(upload_name) == 'zip':
+        return upload_name.replace('.zip', '')
+    return upload_name.replace('.md', '')
+
+
+def _cached_upload_payload(payload, upload_name, upload_hash):
+    """Adapt a cached upload result to the current request's filename."""
+    payload = dict(payload)
+    if upload_name is not None:
+        payload['quiz_name'] = _upload_quiz_name(upload_name)
+    payload['upload_hash'] = upload_hash
+    payload['cached'] = True
+    return payload
+
+
+class UploadJobs:
+    """Run uploads on a small background pool and track their progress.
+
+    ``submit`` refuses new work once ``max_pending`` jobs are queued or
+    running, so a burst of uploads cannot tie up the workers the quiz read
+    endpoints need. Finished jobs are kept for ``ttl`` seconds so the client
+    can collect the result.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, ttl=600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._executor = None
+
+    def submit(self, upload_name, temp_file, upload_hash=None):
+        """Queue a spooled upload; returns a job snapshot, or ``None`` when the queue is full.
+
+        On success the job takes ownership of ``temp_file`` and closes it.
+        """
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+            if active >= self.max_pending:
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='upload-job')
+            job = {
+                'id': uuid.uuid4().hex,
+                'status': 'queued',
+                'upload_name': upload_name,
+                'upload_hash': upload_hash,
+                'created': time.time(),
+                'finished': None,
+                'progress': {'stage': 'queued', 'files_total': 0, 'files_done': 0, 'questions': 0},
+                'result': None,
+                'status_code': None,
+            }
+            self._jobs[job['id']] = job
+            self._executor.submit(self._run, job, temp_file)
+            logger.info(f"Queued upload job {job['id']} for {upload_name}")
+            return self._snapshot(job)
+
+    def _run(self, job, temp_file):
+        with self._lock:
+            job['status'] = 'running'
+        started = time.perf_counter()
+        try:
+            payload, status_code = _process_upload(job['upload_name'], temp_file, job['progress'])
+            if payload.get('success') and job['upload_hash']:
+                upload_result_cache.put(job['upload_hash'], _upload_kind(job['upload_name']), payload)
+                payload = dict(payload, upload_hash=job['upload_hash'])
+        except Exception as e:
+            logger.error(f"Upload job {job['id']} failed: {e}")
+            payload, status_code = {'success': False, 'error': str(e)}, 500
+        finally:
+            temp_file.close()
+        with self._lock:
+            job['progress']['stage'] = 'done'
+            job.update(
+                status='done' if payload.get('success') else 'failed',
+                result=payload,
+                status_code=status_code,
+                finished=time.time()
+            )
+        logger.info(f"Upload job {job['id']} {job['status']} in {time.perf_counter() - started:.2f}s")
+
+    def get(self, job_id):
+        """Return a snapshot of a job, or ``None`` if it is unknown or expired."""
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job is not None else None
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished'] is not None and job['finished'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _snapshot(job):
+        snapshot = dict(job)
+        snapshot['progress'] = dict(job['progress'])
+        return snapshot
+
+
+# Job state and results live in this process and the work runs on a
+# background thread, so async uploads need a long-lived server that receives
+# every poll. On serverless hosts the instance is frozen once the 202 is sent
+# and polls may reach other instances, so they are off unless MLA_UPLOAD_JOBS=1;
+# ?async=1 then just processes the upload synchronously.
+_UPLOAD_JOBS_ENABLED = os.environ.get('MLA_UPLOAD_JOBS', '0') == '1'
+upload_jobs = UploadJobs(
+    max_workers=int(os.environ.get('MLA_UPLOAD_JOB_WORKERS', 2)),
+    max_pending=int(os.environ.get('MLA_UPLOAD_JOB_QUEUE', 8)),
+    ttl=int(os.environ.get('MLA_UPLOAD_JOB_TTL', 600))
+)
+
 
 @app.route('/api/upload-quiz', methods=['POST'])
 def upload_quiz():
@@ -961,8 +4092,7 @@ def upload_quiz():
                 'error': 'No file selected'
             }), 400
 
-        max_bytes = int(4.5 * 1024 * 1024)
-        temp_file = SpooledTemporaryFile(max_size=max_bytes + 1024, mode='w+b')
+        temp_file = SpooledTemporaryFile(max_size=_UPLOAD_SPOOL_BYTES, mode='w+b')
         try:
             try:
                 file.stream.seek(0)
@@ -970,291 +4100,157 @@ def upload_quiz():
                 pass
 
             total_bytes = 0
+            digest = hashlib.sha256()
             while True:
                 chunk = file.stream.read(64 * 1024)
                 if not chunk:
                     break
                 total_bytes += len(chunk)
-                if total_bytes > max_bytes:
+                if total_bytes > _UPLOAD_MAX_BYTES:
                     return jsonify({
                         'success': False,
-                        'error': 'File too large. Maximum size is 4.5MB.'
+                        'error': f'File too large. Maximum size is {_UPLOAD_MAX_BYTES / (1024 * 1024):g}MB.'
                     }), 400
+                digest.update(chunk)
                 temp_file.write(chunk)
 
-            logger.info(f"File size: {total_bytes} bytes")
+            upload_hash = digest.hexdigest()
+            logger.info(f"File size: {total_bytes} bytes, sha256 {upload_hash}")
             temp_file.seek(0)
 
-            if file.filename.lower().endswith('.zip'):
-                logger.info("Processing ZIP file")
+            upload_kind = _upload_kind(file.filename)
+            cached = upload_result_cache.get(upload_hash, upload_kind) if upload_kind else None
+            if upload_kind:
+                metrics.cache_event('upload_result', cached is not None)
+            if cached is not None:
+                logger.info(f"Serving cached result for upload {upload_hash}")
+                return jsonify(_cached_upload_payload(cached, file.filename, upload_hash))
 
-                try:
-                    temp_file.seek(0)
-                    quiz_data = []
-                    image_data = {}  # Store images from zip
-
-                    with zipfile.ZipFile(temp_file, 'r') as zip_ref:
-                        # Get all files in the zip
-                        all_files = zip_ref.namelist()
-                        # Filter out directories and hidden files
-                        actual_files = [f for f in all_files if not f.endswith('/') and not f.startswith('__MACOSX') and not f.startswith('.')]
-                        md_files = [f for f in actual_files if f.lower().endswith(('.md', '.txt')) and not f.startswith('.')]
-                        image_files = [f for f in actual_files if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp'))]
-
-                        logger.debug(f"ZIP contents: {all_files}")
-                        logger.debug(f"Found {len(md_files)} .md files: {md_files}")
-                        logger.debug(f"Found {len(image_files)} image files: {image_files}")
-
-                        if not md_files:
-                            return jsonify({
-                                'success': False,
-                                'error': f'No markdown files found in ZIP. Found files: {actual_files[:10]}... (showing first 10)'
-                            }), 400
-
-                        # Extract and encode images as base64
-                        for image_file in image_files:
-                            try:
-                                with zip_ref.open(image_file) as img_file:
-                                    img_content = img_file.read()
-                                    ext = image_file.lower().split('.')[-1]
-                                    mime_type = {
-                                        'jpg': 'image/jpeg',
-                                        'jpeg': 'image/jpeg',
-                                        'png': 'image/png',
-                                        'gif': 'image/gif',
-                                        'webp': 'image/webp',
-                                        'svg': 'image/svg+xml'
-                                    }.get(ext, 'image/jpeg')
-
-                                    img_base64 = base64.b64encode(img_content).decode('utf-8')
-                                    data_url = f"data:{mime_type};base64,{img_base64}"
-
-                                    primary_key = image_file.replace('\\', '/').lstrip('./')
-                                    image_data[primary_key] = data_url
-
-                                    filename_only = image_file.split('/')[-1]
-                                    name_without_ext = filename_only.rsplit('.', 1)[0]
-
-                                    reference_keys = [
-                                        image_file,
-                                        filename_only,
-                                        name_without_ext,
-                                        filename_only.lower(),
-                                        name_without_ext.lower()
-                                    ]
-
-                                    for ref_key in reference_keys:
-                                        if ref_key != primary_key and ref_key not in image_data:
-                                            image_data[ref_key] = f"__REF__:{primary_key}"
-
-                                    logger.debug(f"Processed image: {image_file} -> primary key: {primary_key}, references: {len(reference_keys)}")
-                            except Exception as e:
-                                logger.warning(f"Could not process image {image_file}: {e}")
-                                continue
+            async_requested = request.args.get('async') == '1' or request.form.get('async') == '1'
+            if async_requested and _UPLOAD_JOBS_ENABLED:
+                job = upload_jobs.submit(file.filename, temp_file, upload_hash)
+                if job is None:
+                    return jsonify({
+                        'success': False,
+                        'error': 'Too many uploads are being processed. Please try again shortly.'
+                    }), 429
+                # The job now owns the spooled file and closes it when done
+                temp_file = None
+                return jsonify({
+                    'success': True,
+                    'job_id': job['id'],
+                    'status': job['status'],
+                    'status_url': f"/api/upload-quiz/{job['id']}"
+                }), 202
 
-                        for filename in md_files:
-                            try:
-                                logger.debug(f"Processing MD file: {filename}")
-                                with zip_ref.open(filename) as md_file:
-                                    raw_content = md_file.read()
-                                    logger.debug(f"Raw content length: {len(raw_content)} bytes")
-
-                                    content = None
-                                    encodings_to_try = ['utf-8', 'utf-8-sig', 'latin1', 'cp1252']
-
-                                    for encoding in encodings_to_try:
-                                        try:
-                                            content = raw_content.decode(encoding)
-                                            logger.debug(f"Successfully decoded with {encoding}")
-                                            break
-                                        except UnicodeDecodeError as e:
-                                            logger.warning(f"Failed to decode with {encoding}: {e}")
-                                            continue
-
-                                    if content is None:
-                                        logger.error(f"Could not decode {filename} with any encoding")
-                                        continue
-
-                                    logger.debug(f"Decoded content length: {len(content)} characters")
-                                    logger.debug(f"First 500 characters: {repr(content[:500])}")
-
-                                    has_questions = bool(re.search(r'###\s*\d+', content))
-                                    has_hash_headers = content.count('###') > 0
-                                    has_bullet_points = content.count('A)') > 0 or content.count('A.') > 0
-
-                                    logger.debug(f"Content validation - has_questions: {has_questions}, has_hash_headers: {has_hash_headers}, has_bullet_points: {has_bullet_points}")
-
-                                    if not has_questions and not has_hash_headers:
-                                        logger.warning(f"File {filename} does not appear to contain quiz questions (no ### headers found)")
-                                        sample_lines = content.split('\n')[:20]
-                                        logger.debug(f"First 20 lines: {sample_lines}")
-
-                                    original_content = content
-                                    replacements_made = 0
-
-                                    for image_path, data_url in image_data.items():
-                                        old_content = content
-                                        content = content.replace(f"({image_path})", f"({data_url})")
-                                        content = content.replace(f'"{image_path}"', f'"{data_url}"')
-                                        content = content.replace(f"'{image_path}'", f"'{data_url}'")
-                                        content = content.replace(f"(./{image_path})", f"({data_url})")
-                                        content = content.replace(f"(../{image_path})", f"({data_url})")
-                                        content = content.replace(f"[IMAGE: {image_path}]", f"![Image]({data_url})")
-                                        content = content.replace(f"[IMAGE:{image_path}]", f"![Image]({data_url})")
-                                        content = content.replace(f"[IMAGE:  {image_path}]", f"![Image]({data_url})")
-                                        content = content.replace(f"[IMAGE:   {image_path}]", f"![Image]({data_url})")
-
-                                        if content != old_content:
-                                            replacements_made += 1
-                                            logger.debug(f"Replaced image reference: {image_path}")
-
-                                    image_pattern = re.compile(r'\[IMAGE:\s*([^\]]+)\]', re.IGNORECASE)
-                                    matches = image_pattern.findall(content)
-
-                                    for match in matches:
-                                        match_clean = match.strip()
-                                        found_replacement = None
-
-                                        for image_path, data_url in image_data.items():
-                                            if (match_clean.lower() == image_path.lower() or
-                                                match_clean.lower() in image_path.lower() or
-                                                image_path.lower() in match_clean.lower()):
-                                                found_replacement = data_url
-                                                logger.debug(f"Found case-insensitive match: '{match_clean}' -> '{image_path}'")
-                                                break
-
-                                        if found_replacement:
-                                            old_content = content
-                                            pattern = re.compile(re.escape(f"[IMAGE: {match_clean}]"), re.IGNORECASE)
-                                            content = pattern.sub(f"![Image]({found_replacement})", content)
-                                            pattern = re.compile(re.escape(f"[IMAGE:{match_clean}]"), re.IGNORECASE)
-                                            content = pattern.sub(f"![Image]({found_replacement})", content)
-
-                                            if content != old_content:
-                                                replacements_made += 1
-                                                logger.debug(f"Case-insensitive replacement: {match_clean}")
-
-                                    logger.debug(f"Made {replacements_made} image replacements in {filename}")
-                                    if replacements_made == 0 and len(image_data) > 0:
-                                        logger.warning(f"No image replacements made in {filename}, but {len(image_data)} images available")
-                                        logger.debug(f"Available images: {list(image_data.keys())}")
-                                        image_refs = re.findall(r'\[IMAGE:\s*([^\]]+)\]', original_content, re.IGNORECASE)
-                                        if image_refs:
-                                            logger.debug(f"Found IMAGE references: {image_refs}")
-                                        else:
-                                            logger.debug("No [IMAGE: ...] references found in content")
-                                        logger.debug(f"Content preview: {original_content[:300]}...")
-
-                                    questions = PWAQuizLoader.parse_markdown_content(content, filename)
-                                    quiz_data.extend(questions)
-                                    logger.debug(f"Extracted {len(questions)} questions from {filename}")
-
-                                    if len(questions) == 0:
-                                        logger.error(f"NO QUESTIONS FOUND in {filename}")
-                                        logger.error(f"Content length: {len(content)} characters")
-                                        logger.error(f"Content preview (first 500 chars): {content[:500]}")
-                                        logger.error(f"Looking for ### patterns...")
-                                        question_matches = re.findall(r'###\s*\d+', content)
-                                        logger.error(f"Found {len(question_matches)} question headers: {question_matches[:5]}")
-                                    else:
-                                        logger.debug(f"Successfully found {len(questions)} questions in {filename}")
-                            except UnicodeDecodeError as e:
-                                logger.warning(f"Could not decode file {filename}: {e}")
-                                continue
-                            except Exception as e:
-                                logger.error(f"Error processing file {filename}: {e}")
-                                continue
+            payload, status_code = _process_upload(file.filename, temp_file)
+            if payload.get('success'):
+                upload_result_cache.put(upload_hash, upload_kind, payload)
+                payload = dict(payload, upload_hash=upload_hash)
+            return jsonify(payload), status_code
+        finally:
+            if temp_file is not None:
+                temp_file.close()
+
+    except Exception as e:
+        logger.error(f"Error uploading quiz: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
-                    if not quiz_data:
-                        error_msg = f'No valid quiz questions found in the uploaded files. Processed {len(md_files)} markdown files: {", ".join([f.split("/")[-1] for f in md_files])}'
-                        logger.error(f"Final error: {error_msg}")
-                        return jsonify({
-                            'success': False,
-                            'error': error_msg
-                        }), 400
 
-                except zipfile.BadZipFile:
-                    logger.error("Invalid ZIP file")
-                    return jsonify({
-                        'success': False,
-                        'error': 'Invalid zip file format'
-                    }), 400
-                except Exception as e:
-                    logger.error(f"ZIP processing error: {e}")
-                    return jsonify({
-                        'success': False,
-                        'error': f'Error processing ZIP file: {str(e)}'
-                    }), 500
+@app.route('/api/upload-quiz/result/<upload_hash>')
+def get_upload_result(upload_hash):
+    """Return a previously processed upload by its SHA-256, without re-uploading."""
+    cached = upload_result_cache.get(upload_hash.lower())
+    if cached is None:
+        return jsonify({
+            'success': False,
+            'error': 'No cached result for this upload'
+        }), 404
+    return jsonify(_cached_upload_payload(cached, None, upload_hash.lower()))
 
-                quiz_name = file.filename.replace('.zip', '')
-                logger.info(f"Successfully processed ZIP file: {len(quiz_data)} total questions, {len(image_data)} images")
 
-                return jsonify({
-                    'success': True,
-                    'quiz_name': quiz_name,
-                    'questions': quiz_data,
-                    'total_questions': len(quiz_data),
-                    'images': image_data
-                })
+@app.route('/api/upload-quiz/<job_id>')
+def upload_job_status(job_id):
+    """Report progress of an async upload job and, once finished, its result."""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Upload job not found or expired'
+        }), 404
 
-            elif file.filename.lower().endswith('.md'):
-                logger.info("Processing MD file")
-                try:
-                    temp_file.seek(0)
-                    content = temp_file.read().decode('utf-8')
-                    questions = PWAQuizLoader.parse_markdown_content(content, file.filename)
+    body = {
+        'success': job['status'] != 'failed',
+        'job_id': job['id'],
+        'status': job['status'],
+        'progress': job['progress']
+    }
+    if job['status'] == 'done':
+        body['result'] = job['result']
+    elif job['status'] == 'failed':
+        body['error'] = job['result'].get('error')
+        body['status_code'] = job['status_code']
+    response = jsonify(body)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+@app.route('/api/quiz/<quiz_name>/specialties')
+def get_quiz_specialties(quiz_name):
+    """List the specialties in a quiz with their question counts."""
+    try:
+        quiz_file = quiz_registry.find_path(quiz_name)
+        
+        if not quiz_file:
+            return jsonify({
+                'success': False,
+                'error': 'Quiz not found'
+            }), 404
 
-                    if not questions:
-                        return jsonify({
-                            'success': False,
-                            'error': 'No valid quiz questions found in the markdown file'
-                        }), 400
+        questions, file_hash, specialty_index = PWAQuizLoader.load_with_index(quiz_file)
 
-                    logger.info(f"Successfully processed MD file: {len(questions)} questions")
+        def payload():
+            return {
+                'success': True,
+                'quiz_name': quiz_name,
+                'specialties': [
+                    {
+                        'name': specialty_index['labels'][key],
+                        'key': key,
+                        'count': len(specialty_index['positions'][key])
+                    }
+                    for key in specialty_index['keys']
+                ],
+                'total_questions': len(questions)
+            }
 
-                    return jsonify({
-                        'success': True,
-                        'quiz_name': file.filename.replace('.md', ''),
-                        'questions': questions,
-                        'total_questions': len(questions)
-                    })
-                except UnicodeDecodeError:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Could not read the markdown file. Please ensure it is UTF-8 encoded.'
-                    }), 400
-                except Exception as e:
-                    logger.error(f"MD processing error: {e}")
-                    return jsonify({
-                        'success': False,
-                        'error': f'Error processing markdown file: {str(e)}'
-                    }), 500
+        if file_hash is None:
+            return jsonify(payload())
 
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': 'Unsupported file type. Please upload .md or .zip files'
-                }), 400
-        finally:
-            temp_file.close()
+        return _cached_json_response(('specialties', quiz_name), file_hash, payload)
 
     except Exception as e:
-        logger.error(f"Error uploading quiz: {e}")
+        logger.error(f"Error listing specialties for {quiz_name}: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+
+_SPECIALTY_MATCH_MODES = ('substring', 'exact', 'prefix')
+
 @app.route('/api/quiz/<quiz_name>/specialty/<specialty>')
 def get_quiz_by_specialty(quiz_name, specialty):
-    """Get questions filtered by specialty."""
+    """Get questions filtered by specialty.
+
+    ``specialty`` may list several specialties separated by commas, or be
+    ``all``; a specialty whose own name contains a comma is matched whole.
+    ``?exclude=`` removes specialties and ``?match=`` selects substring
+    (default), exact or prefix matching. All lookups go through the quiz's
+    specialty index.
+    """
     try:
-        quizzes = PWAQuizLoader.get_available_quizzes()
-        quiz_file = None
-        
-        for quiz in quizzes:
-            if quiz['name'] == quiz_name:
-                quiz_file = quiz['path']
-                break
+        quiz_file = quiz_registry.find_path(quiz_name)
         
         if not quiz_file:
             return jsonify({
@@ -1262,21 +4258,60 @@ def get_quiz_by_specialty(quiz_name, specialty):
                 'error': 'Quiz not found'
             }), 404
         
-        all_questions = PWAQuizLoader.load_from_markdown(quiz_file)
-        
-        # Filter by specialty
-        if specialty.lower() == 'all':
-            filtered_questions = all_questions
-        else:
-            filtered_questions = [q for q in all_questions if specialty.lower() in q['specialty'].lower()]
+        match_mode = request.args.get('match', 'substring').lower()
+        try:
+            if match_mode not in _SPECIALTY_MATCH_MODES:
+                raise ValueError(f'match must be one of: {", ".join(_SPECIALTY_MATCH_MODES)}')
+            query = _question_query_from_request()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        all_questions, file_hash, specialty_index = PWAQuizLoader.load_with_index(quiz_file)
+
+        include_terms = PWAQuizLoader.split_specialty_terms(specialty_index, specialty)
+        exclude_terms = PWAQuizLoader.split_specialty_terms(specialty_index, request.args.get('exclude', ''))
         
-        return jsonify({
-            'success': True,
-            'quiz_name': quiz_name,
-            'specialty': specialty,
-            'questions': filtered_questions,
-            'total_questions': len(filtered_questions)
-        })
+        def payload():
+            # Filter by specialty
+            if any(t.strip().lower() == 'all' for t in include_terms):
+                selected = set(range(len(all_questions)))
+            else:
+                selected = set()
+                for term in include_terms:
+                    for key in PWAQuizLoader.match_specialties(specialty_index, term, match_mode):
+                        selected.update(specialty_index['positions'][key])
+            for term in exclude_terms:
+                for key in PWAQuizLoader.match_specialties(specialty_index, term, match_mode):
+                    selected.difference_update(specialty_index['positions'][key])
+            positions = sorted(selected)
+            
+            page, meta = _apply_question_query(all_questions, query, positions)
+            return {
+                'success': True,
+                'quiz_name': quiz_name,
+                'specialty': specialty,
+                'questions': page,
+                'total_questions': len(positions),
+                **meta
+            }
+
+        if file_hash is None:
+            return jsonify(payload())
+
+        cache_key = (
+            'specialty', quiz_name, specialty, match_mode,
+            tuple(exclude_terms), _question_query_key(query),
+        )
+        # Only one specialty named as in the quiz, unpaged and without
+        # exclusions, is kept in the response cache
+        known = specialty == 'all' or (
+            specialty_index['labels'].get(PWAQuizLoader.normalize_specialty(specialty)) == specialty
+        )
+        store = known and not exclude_terms and not query['offset'] and query['limit'] is None
+        return _cached_json_response(cache_key, file_hash, payload, store=store)
         
     except Exception as e:
         logger.error(f"Error loading quiz by specialty: {e}")
@@ -1298,7 +4333,11 @@ def service_worker():
 @app.route('/static/js/<path:filename>')
 def serve_js(filename):
     """Serve JavaScript files."""
-    return send_from_directory(os.path.join(os.path.dirname(__file__), '..', 'static', 'js'), filename, mimetype='application/javascript')
+    js_dir = os.path.join(os.path.dirname(__file__), '..', 'static', 'js')
+    compressed = _static_compressed_response(js_dir, filename, 'application/javascript')
+    if compressed is not None:
+        return compressed
+    return send_from_directory(js_dir, filename, mimetype='application/javascript')
 
 @app.route('/static/<path:filename>')
 def serve_static(filename):
@@ -1346,6 +4385,13 @@ def test_medical_tools():
             'error': str(e)
         }), 500
 
+# Optional startup pre-warm (MLA_PREWARM=1). Started last, once every helper
+# the loader reaches is defined. Under a pre-forking server, enable it per
+# worker rather than in a preloaded master, since threads do not survive fork.
+# Parse pool workers import this module as well and must not pre-warm.
+if os.environ.get('MLA_PREWARM', '0') == '1' and multiprocessing.parent_process() is None:
+    quiz_prewarmer.start(max_workers=int(os.environ.get('MLA_PREWARM_WORKERS', 2)))
+
 # Vercel serverless function handler
 # This is the main entry point for Vercel
 app = app
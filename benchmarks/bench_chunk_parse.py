@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark chunk-parallel parsing of a single large quiz bank.
+
+Parses one synthetic bank serially and then with 1..N pool workers, checks
+that every run returns exactly the serial output and prints the speedup.
+
+    python benchmarks/bench_chunk_parse.py --questions 10000 --mode process
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+from quizgen import build_bank, load_index
+
+index = load_index()
+
+
+def time_parse(content, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = index.PWAQuizLoader.parse_questions(content)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def reset_pools():
+    """Shut down every parse pool so the next parse starts fresh ones."""
+    with index._parse_executors_lock:
+        executors = list(index._parse_executors.values())
+        index._parse_executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=5000)
+    parser.add_argument('--mode', choices=('process', 'thread'), default='process')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='emit machine-readable results')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    content = build_bank(args.questions)
+
+    index._CHUNK_PARSE_MODE = 'serial'
+    serial_seconds, expected = time_parse(content, args.repeat)
+
+    index._CHUNK_PARSE_MODE = args.mode
+    index._CHUNK_PARSE_MIN_CHARS = 0
+    rows = [{'workers': 0, 'seconds': serial_seconds, 'speedup': 1.0, 'matches_serial': True}]
+    workers = 1
+    while workers <= args.max_workers:
+        index._PARSE_WORKERS = workers
+        reset_pools()
+        # Warm the pool so worker start-up is not counted
+        index.PWAQuizLoader.parse_questions(build_bank(workers * index._CHUNKS_PER_WORKER))
+        seconds, result = time_parse(content, args.repeat)
+        rows.append({
+            'workers': workers,
+            'seconds': seconds,
+            'speedup': serial_seconds / seconds if seconds else 0.0,
+            'matches_serial': result == expected,
+        })
+        workers *= 2
+    reset_pools()
+
+    summary = {
+        'questions': len(expected),
+        'content_chars': len(content),
+        'mode': args.mode,
+        'cpu_count': os.cpu_count(),
+        'runs': rows,
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{summary['questions']} questions, {summary['content_chars']} chars, "
+          f"mode={args.mode}, cpus={summary['cpu_count']}")
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}  match")
+    for row in rows:
+        label = 'serial' if row['workers'] == 0 else row['workers']
+        print(f"{label:>8} {row['seconds']:>9.3f} {row['speedup']:>7.2f}x  {row['matches_serial']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of parser tracing on parse_markdown_content.
+
+Parses one synthetic bank serially with tracing off (INFO, the production
+setting), with every trace record captured and formatted (roughly what the
+parser paid per question before tracing was made lazy) and at DEBUG into a
+null handler, and checks that all runs return the same questions.
+
+    python benchmarks/bench_logging.py --questions 5000 --engine both
+"""
+
+import argparse
+import json
+import logging
+import time
+
+from quizgen import build_bank, load_index
+
+index = load_index()
+
+
+def time_parse(content, repeat, traced=False):
+    loader = index.PWAQuizLoader
+    best = None
+    result = None
+    records = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if traced:
+            with index.parser_trace.capture() as captured:
+                result = loader.parse_markdown_content(content, 'bench')
+            records = len(index.ParserTrace.format_records(captured))
+        else:
+            result = loader.parse_markdown_content(content, 'bench')
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result, records
+
+
+def set_level(level):
+    index.logger.setLevel(level)
+    index.parser_trace.refresh()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=5000)
+    parser.add_argument('--engine', choices=('compiled', 'legacy', 'both'), default='both')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='emit machine-readable results')
+    args = parser.parse_args()
+
+    # Keep DEBUG records off the console; they still go through the logger
+    index.logger.handlers[:] = [logging.NullHandler()]
+    index.logger.propagate = False
+    index._CHUNK_PARSE_MODE = 'serial'
+    content = build_bank(args.questions)
+    engines = ('compiled', 'legacy') if args.engine == 'both' else (args.engine,)
+
+    rows = []
+    for engine in engines:
+        index.PWAQuizLoader.PARSER_ENGINE = engine
+        set_level(logging.INFO)
+        info_seconds, expected, _ = time_parse(content, args.repeat)
+        traced_seconds, traced, records = time_parse(content, args.repeat, traced=True)
+        set_level(logging.DEBUG)
+        debug_seconds, debug, _ = time_parse(content, args.repeat)
+        set_level(logging.INFO)
+        rows.append({
+            'engine': engine,
+            'questions': len(expected),
+            'info_seconds': info_seconds,
+            'traced_seconds': traced_seconds,
+            'debug_seconds': debug_seconds,
+            'trace_records': records,
+            'questions_per_second': len(expected) / info_seconds if info_seconds else 0.0,
+            'matches': traced == expected and debug == expected,
+        })
+
+    summary = {
+        'questions': args.questions,
+        'content_chars': len(content),
+        'runs': rows,
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{summary['questions']} questions, {summary['content_chars']} chars")
+    print(f"{'engine':>9} {'info':>8} {'traced':>8} {'debug':>8} {'records':>8} {'q/s':>9}  match")
+    for row in rows:
+        print(f"{row['engine']:>9} {row['info_seconds']:>8.3f} {row['traced_seconds']:>8.3f} "
+              f"{row['debug_seconds']:>8.3f} {row['trace_records']:>8} "
+              f"{row['questions_per_second']:>9.0f}  {row['matches']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Measure the memory a cached quiz holds per 1,000 questions.
+
+Parses one synthetic bank and compares the bytes retained by the parsed
+list of question dicts with the QuestionStore the loader caches, using
+tracemalloc. Also times building the store and materializing every
+question from it, and checks that the round trip is lossless.
+
+    python benchmarks/bench_memory.py --questions 10000
+"""
+
+import argparse
+import gc
+import json
+import logging
+import time
+import tracemalloc
+
+from quizgen import build_bank, load_index
+
+index = load_index()
+
+
+def retained_bytes(build):
+    """Bytes still allocated once ``build()`` returns, and its result."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=10000)
+    parser.add_argument('--uniform', action='store_true', help='one question layout instead of mixed variants')
+    parser.add_argument('--json', action='store_true', help='emit machine-readable results')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    index._CHUNK_PARSE_MODE = 'serial'
+    content = build_bank(args.questions, mixed=not args.uniform, investigations=0.7, images=0.4)
+    loader = index.PWAQuizLoader
+
+    dict_bytes, questions = retained_bytes(lambda: loader.parse_markdown_content(content))
+    # Parse again inside the measurement so the store is charged for every
+    # string it keeps, not just its own columns
+    store_bytes, store = retained_bytes(lambda: index.QuestionStore(loader.parse_markdown_content(content)))
+
+    started = time.perf_counter()
+    index.QuestionStore(questions)
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    materialized = store.rows(range(len(store)))
+    materialize_seconds = time.perf_counter() - started
+
+    per_thousand = 1000 / len(questions)
+    summary = {
+        'questions': len(questions),
+        'content_chars': len(content),
+        'dict_bytes_per_1000': round(dict_bytes * per_thousand),
+        'store_bytes_per_1000': round(store_bytes * per_thousand),
+        'reduction': 1 - store_bytes / dict_bytes if dict_bytes else 0.0,
+        'irregular_questions': len(store._irregular),
+        'build_seconds': build_seconds,
+        'materialize_seconds': materialize_seconds,
+        'lossless': materialized == questions,
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{summary['questions']} questions, {summary['content_chars']} chars")
+    print(f"list of dicts:  {summary['dict_bytes_per_1000'] / 1024:>8.1f} KiB per 1,000 questions")
+    print(f"QuestionStore:  {summary['store_bytes_per_1000'] / 1024:>8.1f} KiB per 1,000 questions "
+          f"({summary['reduction']:.0%} smaller, {summary['irregular_questions']} stored as-is)")
+    print(f"build {build_seconds * 1000:.1f} ms, materialize all {materialize_seconds * 1000:.1f} ms, "
+          f"lossless={summary['lossless']}")
+
+
+if __name__ == '__main__':
+    main()
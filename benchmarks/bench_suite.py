@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the quiz parser, loader, uploads and API endpoints.
+
+Builds synthetic banks with quizgen and times parse_markdown_content,
+load_from_markdown (cold, from the disk cache and warm), ZIP uploads and
+the quiz endpoints through the Flask test client, all against temporary
+directories. Results are printed or written as JSON; with --compare an
+earlier JSON run is the baseline and any case slower by more than
+--threshold is reported as a regression (exit status 1).
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --compare before.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from quizgen import build_bank, build_zip, load_index
+
+index = load_index()
+
+QUIZ_NAME = 'mla_bench'
+
+
+def time_case(func, repeat, setup=None):
+    """Run ``func`` ``repeat`` times (after ``setup`` each time); returns per-run seconds."""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def summarize(runs, questions=None):
+    result = {
+        'seconds': min(runs),
+        'median': statistics.median(runs),
+        'runs': len(runs),
+    }
+    if questions:
+        result['questions'] = questions
+        result['questions_per_second'] = questions / result['median'] if result['median'] else 0.0
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def isolate(workdir):
+    """Point the quiz registry and every cache at ``workdir``; returns the quiz path."""
+    quiz_dir = os.path.join(workdir, 'quizzes')
+    os.makedirs(quiz_dir)
+    loader = index.PWAQuizLoader
+    loader._DISK_CACHE_DIR = os.path.join(workdir, 'quiz-cache')
+    loader.clear_cache()
+    index.quiz_registry = index.QuizRegistry([quiz_dir])
+    index.image_store = index.ImageStore(os.path.join(workdir, 'images'))
+    index.upload_result_cache = index.UploadResultCache(max_bytes=0)
+    index._clear_response_cache()
+    return os.path.join(quiz_dir, f'{QUIZ_NAME}.md')
+
+
+def write_quiz(path, content):
+    with open(path, 'w', encoding='utf-8') as quiz_file:
+        quiz_file.write(content)
+    # Age the file and its directory past the stat racy window so repeat
+    # loads take the stat-validated fast path, as they would in production
+    aged = time.time() - 60
+    os.utime(path, (aged, aged))
+    os.utime(os.path.dirname(path), (aged, aged))
+
+
+def run_suite(args):
+    loader = index.PWAQuizLoader
+    loader.PARSER_ENGINE = args.engine
+    if args.chunk_mode:
+        index._CHUNK_PARSE_MODE = args.chunk_mode
+    content = build_bank(args.questions, mixed=not args.uniform, investigations=0.7, images=0.4)
+    results = {}
+
+    questions = len(loader.parse_markdown_content(content))
+    results['parse_markdown_content'] = summarize(
+        time_case(lambda: loader.parse_markdown_content(content, 'bench'), args.repeat), questions
+    )
+
+    workdir = tempfile.mkdtemp(prefix='mla-bench-')
+    try:
+        path = isolate(workdir)
+        write_quiz(path, content)
+        disk_cache_enabled = loader._DISK_CACHE_ENABLED
+
+        def cold():
+            loader.clear_cache()
+            loader._DISK_CACHE_ENABLED = False
+
+        results['load_from_markdown_cold'] = summarize(
+            time_case(lambda: loader.load_from_markdown(path), args.repeat, setup=cold), questions
+        )
+
+        def disk_only():
+            loader.clear_cache()
+            loader._DISK_CACHE_ENABLED = True
+
+        disk_only()
+        loader.load_from_markdown(path)
+        results['load_from_markdown_disk'] = summarize(
+            time_case(lambda: loader.load_from_markdown(path), args.repeat, setup=disk_only), questions
+        )
+        results['load_from_markdown_warm'] = summarize(
+            time_case(lambda: loader.load_from_markdown(path), args.repeat)
+        )
+        loader._DISK_CACHE_ENABLED = disk_cache_enabled
+
+        client = index.app.test_client()
+        headers = {'Accept-Encoding': 'gzip'}
+
+        def get(url):
+            response = client.get(url, headers=headers)
+            response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} returned {response.status_code}")
+
+        endpoints = {
+            'quizzes': '/api/quizzes',
+            'quiz': f'/api/quiz/{QUIZ_NAME}',
+            'quiz_page': f'/api/quiz/{QUIZ_NAME}?offset=100&limit=50',
+            'quiz_summary': f'/api/quiz/{QUIZ_NAME}?summary=1',
+            'quiz_meta': f'/api/quiz/{QUIZ_NAME}/meta',
+            'quiz_stream': f'/api/quiz/{QUIZ_NAME}/stream',
+            'specialties': f'/api/quiz/{QUIZ_NAME}/specialties',
+            'specialty': f'/api/quiz/{QUIZ_NAME}/specialty/Specialty%201',
+        }
+        for name, url in endpoints.items():
+            get(url)
+            results[f'endpoint_{name}'] = summarize(time_case(lambda: get(url), args.repeat))
+        results['endpoint_quiz_unserialized'] = summarize(time_case(
+            lambda: get(endpoints['quiz']), args.repeat, setup=index._clear_response_cache
+        ))
+
+        archive = build_zip(args.zip_files, args.zip_questions, args.zip_images, mixed=not args.uniform)
+
+        def upload():
+            response = client.post(
+                '/api/upload-quiz',
+                data={'quiz_file': (io.BytesIO(archive), 'mla_bench.zip')},
+                content_type='multipart/form-data',
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"ZIP upload returned {response.status_code}: {response.get_json()}")
+
+        results['upload_zip'] = summarize(
+            time_case(upload, args.repeat), args.zip_files * args.zip_questions
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'parser_engine': args.engine,
+            'chunk_mode': index._CHUNK_PARSE_MODE,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'config': {
+            'questions': args.questions,
+            'content_chars': len(content),
+            'uniform': args.uniform,
+            'repeat': args.repeat,
+            'zip_files': args.zip_files,
+            'zip_questions': args.zip_questions,
+            'zip_images': args.zip_images,
+        },
+        'results': results,
+    }
+
+
+def compare(summary, baseline, threshold):
+    """Cases at least ``threshold`` slower (best run) than ``baseline``."""
+    regressions = []
+    for name, result in summary['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before['seconds']:
+            continue
+        ratio = result['seconds'] / before['seconds']
+        result['baseline_seconds'] = before['seconds']
+        result['ratio'] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=5000)
+    parser.add_argument('--uniform', action='store_true', help='one question layout instead of mixed variants')
+    parser.add_argument('--engine', choices=('compiled', 'legacy'), default=index.PWAQuizLoader.PARSER_ENGINE)
+    parser.add_argument('--chunk-mode', choices=('serial', 'thread', 'process'))
+    parser.add_argument('--zip-files', type=int, default=3)
+    parser.add_argument('--zip-questions', type=int, default=500)
+    parser.add_argument('--zip-images', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown ratio reported as a regression (default 0.2 = 20%%)')
+    parser.add_argument('--json', action='store_true', help='emit machine-readable results')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    summary = run_suite(args)
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare(summary, json.load(baseline_file), args.threshold)
+        summary['regressions'] = regressions
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(summary, output_file, indent=2)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        config = summary['config']
+        print(f"{config['questions']} questions, {config['content_chars']} chars, "
+              f"engine={summary['meta']['parser_engine']}, rev={summary['meta']['revision']}")
+        print(f"{'case':<32} {'best ms':>9} {'median ms':>10} {'q/s':>9} {'vs base':>8}")
+        for name, result in summary['results'].items():
+            qps = f"{result['questions_per_second']:.0f}" if 'questions_per_second' in result else '-'
+            ratio = f"{result['ratio']:.2f}x" if 'ratio' in result else '-'
+            flag = '  REGRESSION' if name in regressions else ''
+            print(f"{name:<32} {result['seconds'] * 1000:>9.2f} {result['median'] * 1000:>10.2f} "
+                  f"{qps:>9} {ratio:>8}{flag}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
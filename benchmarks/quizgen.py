@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Synthetic quiz banks for the benchmarks.
+
+``build_bank`` writes markdown in the layout PWAQuizLoader parses. With the
+defaults every question uses the same layout (the bank the parser
+benchmarks have always used); ``mixed=True`` draws each question's option,
+answer, investigation, image and explanation styles from the variants the
+parser accepts. ``build_zip`` packs several banks and the images they
+reference into an upload-style ZIP. ``load_index`` imports the app module
+(api/index.py) for the benchmarks, wherever they are run from.
+
+    python benchmarks/quizgen.py --questions 2000 --mixed > bank.md
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import zipfile
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+
+# Variants the parser accepts; the first of each is the uniform layout
+OPTION_STYLES = {
+    'dot': '{label}. {text}',
+    'paren': '{label}) {text}',
+}
+ANSWER_STYLES = ('**Answer:** {label}', '**Answer**: {label}', '**Ans:** {label}', '**Answer** {label}')
+INVESTIGATION_STYLES = ('**Investigations:**', '**Investigation:**', '**Investigations**:')
+IMAGE_STYLES = ('[IMAGE: {name}]', '![Image]({name})')
+EXPLANATION_STYLES = ('**Explanation**: {text}', '**Rationale**: {text}', 'Explanation: {text}')
+
+OPTIONS = ('Aspirin', 'Heparin', 'Thrombolysis', 'PCI', 'Discharge')
+
+
+def load_index():
+    """Import and return the app module the benchmarks measure."""
+    if API_DIR not in sys.path:
+        sys.path.insert(0, API_DIR)
+    import index
+    return index
+
+
+def image_name(index):
+    return f"ecg_{index}.png"
+
+
+def build_bank(question_count, per_specialty=100, investigations=1.0, images=1.0,
+               option_style='dot', mixed=False, image_pool=None, seed=0):
+    """Markdown bank of ``question_count`` questions.
+
+    ``per_specialty`` questions share each ``##`` specialty header;
+    ``investigations`` and ``images`` are the fractions of questions with an
+    Investigations line and an image reference. Image references cycle over
+    ``image_pool`` names when given, otherwise every question has its own.
+    """
+    rng = random.Random(seed)
+
+    def chance(fraction):
+        return fraction >= 1 or (fraction > 0 and rng.random() < fraction)
+
+    def style(variants):
+        return rng.choice(variants) if mixed else variants[0]
+
+    option_styles = tuple(OPTION_STYLES.values())
+    parts = []
+    for i in range(1, question_count + 1):
+        if i % per_specialty == 1 or per_specialty == 1:
+            parts.append(f"## Specialty {i // per_specialty}\n")
+        lines = [
+            f"### {i}. Question {i}",
+            f"A {20 + i % 60}-year-old presents with chest pain radiating to the left arm.",
+            "",
+        ]
+        if chance(investigations):
+            lines += [f"{style(INVESTIGATION_STYLES)} Hb {80 + i % 70} g/L, troponin raised", ""]
+        if chance(images):
+            name = image_name(i if image_pool is None else i % image_pool)
+            lines += [style(IMAGE_STYLES).format(name=name), ""]
+        option_format = style(option_styles) if mixed else OPTION_STYLES[option_style]
+        lines.append("What is the most appropriate next step?")
+        lines += [option_format.format(label=label, text=text) for label, text in zip('ABCDE', OPTIONS)]
+        lines += [
+            "",
+            style(ANSWER_STYLES).format(label='ABCDE'[i % 5]),
+            "",
+            style(EXPLANATION_STYLES).format(text=f"Explanation for question {i}."),
+        ]
+        parts.append('\n'.join(lines) + '\n')
+    return '\n'.join(parts)
+
+
+def build_zip(file_count=3, questions_per_file=500, image_count=20, image_bytes=4096, mixed=False, seed=0):
+    """Upload-style ZIP of ``file_count`` banks plus ``image_count`` images they reference."""
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for k in range(image_count):
+            archive.writestr(f"images/{image_name(k)}", rng.randbytes(image_bytes))
+        for f in range(file_count):
+            bank = build_bank(questions_per_file, images=0.5, mixed=mixed,
+                              image_pool=image_count or None, seed=seed + f)
+            archive.writestr(f"quiz/mla_part_{f}.md", bank)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--per-specialty', type=int, default=100)
+    parser.add_argument('--investigations', type=float, default=1.0)
+    parser.add_argument('--images', type=float, default=1.0)
+    parser.add_argument('--option-style', choices=sorted(OPTION_STYLES), default='dot')
+    parser.add_argument('--mixed', action='store_true', help='vary the layout per question')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.stdout.write(build_bank(
+        args.questions, args.per_specialty, args.investigations, args.images,
+        args.option_style, args.mixed, seed=args.seed,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -3886,7 +3886,7 @@ class MLAQuizApp {
                             console.log('🖼️ IMAGE DEBUG - Resolved reference from', foundKey, 'to', refKey);
                         }
                         
-                        if (imageData && imageData.startsWith('data:')) {
+                        if (imageData && (imageData.startsWith('data:') || imageData.startsWith('/api/images/'))) {
                             // Found actual image data
                             return `<div class="image-container"><img src="${imageData}" alt="Image" loading="lazy" onclick="window.openImageModal && openImageModal('${imageData}', 'Image')"></div>`;
                         } else {
@@ -3934,7 +3934,7 @@ class MLAQuizApp {
                             console.log('🖼️ IMAGE DEBUG - Resolved nested reference from', refKey, 'to', secondRefKey);
                         }
                         
-                        if (imageData && imageData.startsWith('data:')) {
+                        if (imageData && (imageData.startsWith('data:') || imageData.startsWith('/api/images/'))) {
                             actualUrl = imageData;
                             console.log('✅ Resolved markdown reference to base64 data');
                         } else {
@@ -125,6 +125,27 @@ self.addEventListener('fetch', (event) => {
 
     // Handle API requests with network-first strategy for quiz data
     if (url.pathname.startsWith('/api/')) {
+        // Uploaded images are content-addressed and never change - cache first
+        if (url.pathname.startsWith('/api/images/')) {
+            event.respondWith(
+                caches.match(request).then((cachedResponse) => {
+                    if (cachedResponse) {
+                        return cachedResponse;
+                    }
+                    return fetch(request).then((response) => {
+                        if (response.status === 200) {
+                            const responseClone = response.clone();
+                            caches.open(QUIZ_CACHE).then((cache) => {
+                                cache.put(request, responseClone);
+                            });
+                        }
+                        return response;
+                    });
+                })
+            );
+            return;
+        }
+
         // Special handling for quiz data - cache aggressively for offline access
         if (url.pathname.startsWith('/api/quiz/') && !url.pathname.includes('/submit')) {
             event.respondWith(